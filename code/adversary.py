@@ -0,0 +1,57 @@
+
+import numpy as np
+
+#worst-case deviation for fixed schedules. with 0 <= delta <= 1 and
+#sum(delta) <= Gamma the adversary problem is a fractional knapsack: the Gamma
+#largest deviation costs p_hat[i]*(n+1-j) are taken in full and the next one
+#by the fractional part of Gamma, so no LP is needed
+
+def adv(p_bar, p_hat, Gamma, x):
+
+    #x[i][j] = 1 if job i is in position j
+    perm = np.argmax(np.asarray(x), axis=0)
+
+    return(float(adv_perm(p_bar, p_hat, Gamma, perm)))
+
+#perm[..., j] is the job in position j, either one schedule of shape (n,) or a
+#batch of shape (B, n). Gamma is a scalar or an array of shape (G,). the
+#result has shape perm.shape[:-1] + np.shape(Gamma)
+def adv_perm(p_bar, p_hat, Gamma, perm):
+
+    p_bar = np.asarray(p_bar, dtype=float)
+    p_hat = np.asarray(p_hat, dtype=float)
+    perm = np.asarray(perm)
+    n = perm.shape[-1]
+    weight = n + 1 - np.arange(n)
+
+    nominal = (p_bar[perm]*weight).sum(axis=-1)
+
+    #deviation costs sorted in decreasing order, padded with a zero so that
+    #Gamma >= n picks up no fractional term
+    dev = -np.sort(-p_hat[perm]*weight, axis=-1)
+    dev = np.concatenate([dev, np.zeros(dev.shape[:-1] + (1,))], axis=-1)
+    prefix = np.concatenate([np.zeros(dev.shape[:-1] + (1,)), np.cumsum(dev, axis=-1)], axis=-1)
+
+    Gamma = np.minimum(np.asarray(Gamma, dtype=float), n)
+    k = np.floor(Gamma).astype(int)
+    frac = Gamma - k
+    objval = nominal[..., None] + prefix[..., k.ravel()] + frac.ravel()*dev[..., k.ravel()]
+
+    return(objval.reshape(nominal.shape + Gamma.shape))
+
+#optimal duals of the adversary LP for one schedule perm, i.e. the pi and
+#rho[i] >= p_hat[i]*(n+1-j) - pi of the min_max formulation: pi is the
+#deviation cost ranked just after the floor(Gamma) largest ones
+def adv_dual(p_bar, p_hat, Gamma, perm):
+
+    p_hat = np.asarray(p_hat, dtype=float)
+    n = len(p_hat)
+    pos = np.empty(n, dtype=int)
+    pos[np.asarray(perm)] = np.arange(n)
+    dev = p_hat*(n + 1 - pos)
+
+    k = int(np.floor(min(Gamma, n)))
+    pi = float(-np.sort(-dev)[k]) if k < n else 0.0
+    rho = np.maximum(dev - pi, 0).tolist()
+
+    return(pi, rho)
@@ -1,110 +1,150 @@
 from gurobipy import *
+from backend import GurobiModel
+import formulations
+from minmax import min_max_start
+from preprocessing import dominance
+from recovery import pattern, recovery_lp
+from solution import get_sol, optimize, optimize_from_start, start_lists
+import numpy as np
 import random
+import scipy.sparse as sp
+import time
+
+#builds model2 of formulations.model2 without solving it. returns the model
+#and its variables, plus the constraints whose right-hand side depends on
+#Delta under 'recovery'. with the result pre of preprocessing.dominance,
+#x[j,l] outside the position windows and w[i,j,l] = y[i,j]*x[j,l] are not
+#built and the jobs are ordered by the precedences; var['eliminated'] counts
+#the variables left out
+def build_model2(p_bar, p_hat, Gamma, Delta, time_limit, threads=4, name="model2", pre=None, env=None):
+
+    start = time.time()
+    model = Model(name, env=env)
+    model.setParam("TimeLimit", time_limit)
+    model.setParam("Threads", threads)
 
-def model2(p_bar, p_hat, Gamma, Delta, time_limit):
+    var = formulations.model2(GurobiModel(model), p_bar, p_hat, Gamma, Delta, pre)
+    model._build_time = time.time() - start
+    return(model, var)
 
-    n = len(p_bar)
-    N = [i for i in range(n)]
+def model2(p_bar, p_hat, Gamma, Delta, time_limit, threads=4, preprocess=False, env=None):
 
-    model = Model("model2")
+    #dominance preprocessing, see preprocessing.py
+    pre = dominance(p_bar, p_hat, Gamma, Delta) if preprocess else None
+    model, var = build_model2(p_bar, p_hat, Gamma, Delta, time_limit, threads, pre=pre, env=env)
 #    model.setParam("OutputFlag", 0)
-    model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
-
-    #variables
-    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    y = model.addVars([(i,j) for i in N for j in N], vtype=GRB.CONTINUOUS, name="y", lb=0, ub=1)
-    w = model.addVars([(i,j,l) for i in N for j in N for l in N], vtype=GRB.CONTINUOUS, name="w", lb=0)
-    pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
-    rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
-
-    #objective
-    model.setObjective(quicksum((n+1)*p_bar[i]*y[i,j] - quicksum(w[i,j,l]*p_bar[i]*l for l in N) for i in N for j in N) + Gamma*pi + quicksum(rho[i] for i in N))
 
-    #constraints
-    model.addConstrs(quicksum(y[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(y[i,j] for j in N) == 1 for i in N)
-    model.addConstr(quicksum(y[i,i] for i in N) >= n - 2*Delta)
-    model.addConstrs(y[i,j] == y[j,i] for i in N for j in N)
-    model.addConstrs(pi + rho[i] >= quicksum((n+1)*p_hat[i]*y[i,j] - quicksum(w[i,j,l]*p_hat[i]*l for l in N) for j in N) for i in N)
-    model.addConstrs(w[i,j,l] <= x[j,l] for i in N for j in N for l in N)
-    model.addConstrs(w[i,j,l] <= y[i,j] for i in N for j in N for l in N)
-    model.addConstrs(w[i,j,l] >= y[i,j] - (1-x[j,l]) for i in N for j in N for l in N)
-    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
-
-    model.optimize()
+    optimize(model)
     
-    sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':model.ObjVal, 'mipgap':model.MIPGap, 'runtime':model.Runtime}
+    sol = get_sol(model)
+    sol['eliminated'] = var['eliminated']
     return(sol)
 
 
-def model2_ws(p_bar, p_hat, Gamma, Delta, time_limit):
+#complete MIP start for model2 from the schedule perm, perm[j] is the job in
+#position j. the recovery is the optimal one of recovery_lp: y[i,j] = y[j,i]
+#is the swap of e = (i,j), y[i,i] what is left of job i, w[i,j,l] is
+#y[i,j]*x[j,l] and pi, rho are the adversary duals. returns the variables,
+#their start values and the objective value of the start
+def model2_start_values(var, p_bar, p_hat, Gamma, Delta, perm):
 
     n = len(p_bar)
-    N = [i for i in range(n)]
-    
-    #solving min_max model to get warmstart solution
-    model = Model("min_max")
-    model.setParam("OutputFlag", 0)
-    model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
+    E0, E1, _, _ = pattern(n)
+    rec = recovery_lp(p_bar, p_hat, Gamma, Delta, perm)
 
-    #variables
-    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
-    rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
+    X = np.zeros((n, n))
+    X[np.asarray(perm), np.arange(n)] = 1
+    Y = np.zeros((n, n))
+    Y[E0, E1] = Y[E1, E0] = np.clip(rec['y'], 0, 1)
+    Y[np.arange(n), np.arange(n)] = 1 - Y.sum(axis=1)
+    W = np.einsum('ij,jl->ijl', Y, X)
 
-    #objective
-    model.setObjective(quicksum(p_bar[i]*(n+1-j)*x[i,j] for i in N for j in N) + Gamma*pi + quicksum(rho[i] for i in N))
-    
-    #constraints
-    model.addConstrs(pi + rho[i] >= quicksum(p_hat[i]*(n+1-j)*x[i,j] for j in N) for i in N)
-    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
-    
-    model.optimize()
-    
-    ws_x = [[model.getVarByName("x[{},{}]".format(i,j)).X for j in N] for i in N]
-    ws_pi = model.getVarByName("pi").X
-    ws_rho = [model.getVarByName("rho[{}]".format(i)).X for i in N]
+    variables, values = start_lists(var, {'x':X, 'y':Y, 'w':W, 'rho':rec['rho']}, rec['pi'])
+    return(variables, values, rec['objval'])
+
+def model2_start(model, var, p_bar, p_hat, Gamma, Delta, perm):
+
+    variables, values, objval = model2_start_values(var, p_bar, p_hat, Gamma, Delta, perm)
+    model.setAttr("Start", variables, values)
+
+    return(objval)
+
+def model2_ws(p_bar, p_hat, Gamma, Delta, time_limit, start=None, threads=4, env=None):
+
+    #min_max schedule as warmstart, unless a schedule is given (start[j] is
+    #the job in position j)
+    if start is None:
+        start = min_max_start(p_bar, p_hat, Gamma)['perm']
 
     #solving model2 with warmstart
-    model = Model("model2_ws")
+    model, var = build_model2(p_bar, p_hat, Gamma, Delta, time_limit, threads, name="model2_ws", env=env)
     model.setParam("OutputFlag", 0)
+    start_objval = model2_start(model, var, p_bar, p_hat, Gamma, Delta, start)
+
+    sol = optimize_from_start(model, start_objval)
+    return(sol)
+
+
+#model2 built in bulk through the matrix API. variables are flat MVars with
+#w[i,j,l] at index (i*n + j)*n + l and x[j,l], y[i,j] at j*n + l, i*n + j, so
+#every O(n^3) block is a single sparse coefficient matrix
+def model2_matrix(p_bar, p_hat, Gamma, Delta, time_limit, threads=4, env=None):
+
+    start = time.time()
+    n = len(p_bar)
+    p_bar = np.asarray(p_bar, dtype=float)
+    p_hat = np.asarray(p_hat, dtype=float)
+    L = np.arange(n)
+
+    model = Model("model2_matrix", env=env)
+#    model.setParam("OutputFlag", 0)
     model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
+    model.setParam("Threads", threads)
 
     #variables
-    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    y = model.addVars([(i,j) for i in N for j in N], vtype=GRB.CONTINUOUS, name="y", lb=0, ub=1)
-    w = model.addVars([(i,j,l) for i in N for j in N for l in N], vtype=GRB.CONTINUOUS, name="w", lb=0)
-    pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
-    rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
-    
-    #setting warmstart
-    pi.start = ws_pi
-    for i in N:
-        rho[i].start = ws_rho[i]
-        for j in N:
-            x[i,j].start = ws_x[i][j]
+    x = model.addMVar(n*n, vtype=GRB.BINARY, name="x")
+    y = model.addMVar(n*n, vtype=GRB.CONTINUOUS, name="y", lb=0, ub=1)
+    w = model.addMVar(n*n*n, vtype=GRB.CONTINUOUS, name="w", lb=0)
+    pi = model.addMVar(1, vtype=GRB.CONTINUOUS, name="pi", lb=0)
+    rho = model.addMVar(n, vtype=GRB.CONTINUOUS, name="rho", lb=0)
+
+    #index maps of w[i,j,l] onto y[i,j], x[j,l] and of i onto (i,j) and (i,j,l)
+    W = np.arange(n*n*n)
+    Y = np.arange(n*n)
+    w_to_y = sp.csr_matrix((np.ones(n**3), (W, W//n)), shape=(n**3, n*n))
+    w_to_x = sp.csr_matrix((np.ones(n**3), (W, W % (n*n))), shape=(n**3, n*n))
+    row_sum = sp.csr_matrix((np.ones(n*n), (Y//n, Y)), shape=(n, n*n))
+    col_sum = sp.csr_matrix((np.ones(n*n), (Y % n, Y)), shape=(n, n*n))
+    transpose = sp.csr_matrix((np.ones(n*n), (Y, (Y % n)*n + Y//n)), shape=(n*n, n*n))
+    diag = (Y//n == Y % n).astype(float)
+    ones = sp.csr_matrix(np.ones((n, 1)))
+
+    #cost coefficients of y[i,j] and w[i,j,l] per unit of p_bar[i] (or p_hat[i])
+    c_y = np.full(n*n, n + 1.0)
+    c_w = np.tile(L, n*n).astype(float)
+    p_bar_y, p_hat_y = np.repeat(p_bar, n), np.repeat(p_hat, n)
+    p_bar_w, p_hat_w = np.repeat(p_bar, n*n), np.repeat(p_hat, n*n)
+    dev_y = sp.csr_matrix((c_y*p_hat_y, (Y//n, Y)), shape=(n, n*n))
+    dev_w = sp.csr_matrix((c_w*p_hat_w, (W//(n*n), W)), shape=(n, n**3))
 
     #objective
-    model.setObjective(quicksum((n+1)*p_bar[i]*y[i,j] - quicksum(w[i,j,l]*p_bar[i]*l for l in N) for i in N for j in N) + Gamma*pi + quicksum(rho[i] for i in N))
+    model.setObjective((c_y*p_bar_y) @ y - (c_w*p_bar_w) @ w + Gamma*pi.sum() + rho.sum())
 
     #constraints
-    model.addConstrs(quicksum(y[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(y[i,j] for j in N) == 1 for i in N)
-    model.addConstr(quicksum(y[i,i] for i in N) >= n - 2*Delta)
-    model.addConstrs(y[i,j] == y[j,i] for i in N for j in N)
-    model.addConstrs(pi + rho[i] >= quicksum((n+1)*p_hat[i]*y[i,j] - quicksum(w[i,j,l]*p_hat[i]*l for l in N) for j in N) for i in N)
-    model.addConstrs(w[i,j,l] <= x[j,l] for i in N for j in N for l in N)
-    model.addConstrs(w[i,j,l] <= y[i,j] for i in N for j in N for l in N)
-    model.addConstrs(w[i,j,l] >= y[i,j] - (1-x[j,l]) for i in N for j in N for l in N)
-    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
-
-    model.optimize()
-
-    sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':model.ObjVal, 'mipgap':model.MIPGap, 'runtime':model.Runtime}
+    model.addConstr(col_sum @ y == 1)
+    model.addConstr(row_sum @ y == 1)
+    model.addConstr(diag @ y >= n - 2*Delta)
+    model.addConstr(y - transpose @ y == 0)
+    model.addConstr(ones @ pi + rho - dev_y @ y + dev_w @ w >= 0)
+    model.addConstr(w - w_to_x @ x <= 0)
+    model.addConstr(w - w_to_y @ y <= 0)
+    model.addConstr(w - w_to_y @ y - w_to_x @ x >= -1)
+    model.addConstr(col_sum @ x == 1)
+    model.addConstr(row_sum @ x == 1)
+
+    model._build_time = time.time() - start
+
+    optimize(model)
+
+    sol = get_sol(model)
     return(sol)
@@ -0,0 +1,357 @@
+
+import time
+import numpy as np
+import scipy.sparse as sp
+from memory import peak_rss
+
+#backend-neutral model building. a LinearModel collects variables, linear
+#constraints and the objective in sparse matrix form, min/max c @ x + c0
+#s.t. A @ x (<=, >=, ==) b, lb <= x <= ub, and solve() hands the matrices to
+#one of the backends:
+#
+#  'gurobi'  gurobipy matrix API, the sol is that of solution.get_sol
+#  'highs'   scipy.optimize.milp (HiGHS)
+#  'scip'    OR-Tools linear solver with SCIP
+#
+#CP-SAT is not a backend: it only has integer variables and would solve a
+#scaled and rounded approximation of every formulation, which has continuous
+#variables. CP-SAT solves the exact model1 of cpsat.py (method general_cp)
+#
+#the sol dict has the same entries on every backend, with the status mapped
+#onto Gurobi's status codes. gurobipy is only imported by the Gurobi
+#adapter, so the other backends run without a Gurobi installation.
+#
+#the formulations of formulations.py are written once against the modelling
+#interface of LinearModel (add_var, add_vars, add_constr, add_constrs,
+#set_objective and sum). GurobiModel offers the same interface on a gurobipy
+#Model, which is how the Gurobi modules build their models
+
+BACKENDS = ['gurobi', 'highs', 'scip']
+
+#Gurobi's GRB.INFINITY and status codes
+INFINITY = 1e100
+OPTIMAL, INFEASIBLE, UNBOUNDED, TIME_LIMIT, NUMERIC = 2, 3, 5, 9, 12
+
+MINIMIZE, MAXIMIZE = 1, -1
+
+#linear expression, a dict of variable index to coefficient plus a constant
+class Expr:
+
+    __slots__ = ('terms', 'const')
+
+    def __init__(self, terms=None, const=0.0):
+
+        self.terms = terms if terms is not None else {}
+        self.const = const
+
+    def copy(self):
+
+        return(Expr(dict(self.terms), self.const))
+
+    def add(self, other, sign=1):
+
+        if isinstance(other, Expr):
+            for v, a in other.terms.items():
+                self.terms[v] = self.terms.get(v, 0.0) + sign*a
+            self.const += sign*other.const
+        else:
+            self.const += sign*other
+        return(self)
+
+    def __add__(self, other):
+
+        return(self.copy().add(other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+
+        return(self.copy().add(other, -1))
+
+    def __rsub__(self, other):
+
+        return((-self).add(other))
+
+    def __neg__(self):
+
+        return(self*-1)
+
+    def __mul__(self, a):
+
+        return(Expr({v:a*c for v, c in self.terms.items()}, a*self.const))
+
+    __rmul__ = __mul__
+
+    def __le__(self, other):
+
+        return((self - other, '<'))
+
+    def __ge__(self, other):
+
+        return((self - other, '>'))
+
+    def __eq__(self, other):
+
+        return((self - other, '='))
+
+    __hash__ = None
+
+#sum of expressions and numbers, the counterpart of quicksum
+def lsum(items):
+
+    expr = Expr()
+    for item in items:
+        expr.add(item)
+    return(expr)
+
+class LinearModel:
+
+    def __init__(self, name):
+
+        self.name = name
+        self.lb, self.ub, self.integer = [], [], []
+        self.rows, self.cols, self.coefs, self.senses, self.rhs = [], [], [], [], []
+        self.objective, self.sense = Expr(), MINIMIZE
+        self.build_time = 0.0
+
+    #names are only used by GurobiModel
+    def add_var(self, lb=0.0, ub=INFINITY, integer=False, name=""):
+
+        self.lb.append(lb)
+        self.ub.append(ub)
+        self.integer.append(integer)
+        return(Expr({len(self.lb) - 1:1.0}))
+
+    #dict of key to variable, as Model.addVars
+    def add_vars(self, keys, lb=0.0, ub=INFINITY, integer=False, name=""):
+
+        return({key:self.add_var(lb, ub, integer) for key in keys})
+
+    #constraint (expr, sense) as returned by the comparisons of Expr. returns
+    #its row
+    def add_constr(self, constr, name=""):
+
+        expr, sense = constr
+        row = len(self.senses)
+        for v, a in expr.terms.items():
+            if a != 0:
+                self.rows.append(row)
+                self.cols.append(v)
+                self.coefs.append(a)
+        self.senses.append(sense)
+        self.rhs.append(-expr.const)
+        return(row)
+
+    def add_constrs(self, constrs, name=""):
+
+        return([self.add_constr(constr) for constr in constrs])
+
+    def sum(self, items):
+
+        return(lsum(items))
+
+    def set_objective(self, expr, sense=MINIMIZE):
+
+        self.objective, self.sense = expr, sense
+
+    @property
+    def num_vars(self):
+
+        return(len(self.lb))
+
+    @property
+    def num_constrs(self):
+
+        return(len(self.senses))
+
+    #c, c0, A (csr), senses, b, lb, ub and integrality of the model
+    def matrices(self):
+
+        c = np.zeros(self.num_vars)
+        for v, a in self.objective.terms.items():
+            c[v] = a
+        A = sp.csr_matrix((self.coefs, (self.rows, self.cols)), shape=(self.num_constrs, self.num_vars))
+
+        return(c, self.objective.const, A, np.array(self.senses), np.array(self.rhs, dtype=float), np.array(self.lb, dtype=float),
+               np.array(self.ub, dtype=float), np.array(self.integer, dtype=bool))
+
+#value of the expression expr in the solution of a sol
+def value(expr, sol):
+
+    return(expr.const + sum(a*sol['solution'][v] for v, a in expr.terms.items()))
+
+#sol of a backend other than Gurobi, with the statistics of solution.py that
+#the backend reports and None for the others
+def make_sol(m, status, objval, objbound, runtime, solution, build_time, nonzeros, node_count=None, iter_count=None):
+
+    if objval is None or not np.isfinite(objval):
+        objval = m.sense*INFINITY
+    if objbound is None or not np.isfinite(objbound):
+        objbound = -m.sense*INFINITY
+    mipgap = abs(objval - objbound)/abs(objval) if objval != 0 and abs(objval) < INFINITY else INFINITY
+    sol = {'status':status, 'objbound':objbound, 'objval':objval, 'mipgap':mipgap, 'runtime':runtime,
+           'build_time':build_time, 'optimize_time':runtime, 'num_vars':m.num_vars, 'num_constrs':m.num_constrs, 'num_nzs':nonzeros,
+           'presolved_vars':None, 'presolved_constrs':None, 'presolved_nzs':None, 'node_count':node_count, 'iter_count':iter_count,
+           'peak_rss_mb':peak_rss(), 'solution':solution}
+    return(sol)
+
+#the modelling interface of LinearModel on the gurobipy Model model. the
+#variables and constraints are those of gurobipy (Var, tupledict, Constr), so
+#MIP starts, callbacks and the model cache work with the var dicts of the
+#formulations. integer variables with bounds 0 and 1 are binary
+class GurobiModel:
+
+    def __init__(self, model):
+
+        from gurobipy import GRB, quicksum
+
+        self.model = model
+        self.GRB = GRB
+        self.quicksum = quicksum
+
+    def vtype(self, lb, ub, integer):
+
+        if not integer:
+            return(self.GRB.CONTINUOUS)
+        return(self.GRB.BINARY if lb == 0 and ub == 1 else self.GRB.INTEGER)
+
+    def add_var(self, lb=0.0, ub=INFINITY, integer=False, name=""):
+
+        return(self.model.addVar(lb=lb, ub=ub, vtype=self.vtype(lb, ub, integer), name=name))
+
+    def add_vars(self, keys, lb=0.0, ub=INFINITY, integer=False, name=""):
+
+        return(self.model.addVars(keys, lb=lb, ub=ub, vtype=self.vtype(lb, ub, integer), name=name))
+
+    def add_constr(self, constr, name=""):
+
+        return(self.model.addConstr(constr, name=name))
+
+    #constrs has to be a generator expression, Model.addConstrs takes the keys
+    #of the constraints from its loop variables
+    def add_constrs(self, constrs, name=""):
+
+        return(self.model.addConstrs(constrs, name=name))
+
+    def set_objective(self, expr, sense=MINIMIZE):
+
+        self.model.setObjective(expr, self.GRB.MINIMIZE if sense == MINIMIZE else self.GRB.MAXIMIZE)
+
+    def sum(self, items):
+
+        return(self.quicksum(items))
+
+def solve_gurobi(m, time_limit, threads):
+
+    from gurobipy import GRB, Model
+    from solution import get_sol, optimize, statistics
+
+    start = time.time()
+    c, c0, A, senses, b, lb, ub, integer = m.matrices()
+    model = Model(m.name)
+    model.setParam("OutputFlag", 0)
+    model.setParam("TimeLimit", time_limit)
+    model.setParam("Threads", threads)
+    x = model.addMVar(m.num_vars, lb=np.maximum(lb, -GRB.INFINITY), ub=np.minimum(ub, GRB.INFINITY),
+                      vtype=np.where(integer, np.where((lb == 0) & (ub == 1), GRB.BINARY, GRB.INTEGER), GRB.CONTINUOUS))
+    model.setObjective(c @ x + c0, GRB.MINIMIZE if m.sense == MINIMIZE else GRB.MAXIMIZE)
+    model.addMConstr(A, x, senses, b)
+    model._build_time = m.build_time + time.time() - start
+
+    optimize(model)
+
+    if model.SolCount > 0 and model.IsMIP:
+        sol = get_sol(model)
+        sol['solution'] = x.X
+    elif model.SolCount > 0:
+        #get_sol reads MIPGap, which LPs do not have
+        sol = {'status':model.Status, 'objbound':model.ObjVal, 'objval':model.ObjVal, 'mipgap':0.0, 'runtime':model.Runtime}
+        sol.update(statistics(model), solution=x.X)
+    else:
+        sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':m.sense*INFINITY, 'mipgap':INFINITY, 'runtime':model.Runtime}
+        sol.update(statistics(model), solution=None)
+    return(sol)
+
+#scipy.optimize.milp status: 0 optimal, 1 iteration or time limit, 2
+#infeasible, 3 unbounded, 4 other
+HIGHS_STATUS = {0:OPTIMAL, 1:TIME_LIMIT, 2:INFEASIBLE, 3:UNBOUNDED, 4:NUMERIC}
+
+#milp has no thread count, HiGHS runs its MIP search on one thread
+def solve_highs(m, time_limit, threads):
+
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    start = time.time()
+    c, c0, A, senses, b, lb, ub, integer = m.matrices()
+    row_lb = np.where(senses == '<', -np.inf, b)
+    row_ub = np.where(senses == '>', np.inf, b)
+    lb, ub = np.where(lb <= -INFINITY, -np.inf, lb), np.where(ub >= INFINITY, np.inf, ub)
+    build_time = m.build_time + time.time() - start
+
+    start = time.time()
+    res = milp(m.sense*c, integrality=integer.astype(int), bounds=Bounds(lb, ub), constraints=LinearConstraint(A, row_lb, row_ub),
+               options={'time_limit':time_limit})
+    runtime = time.time() - start
+
+    objval = m.sense*res.fun + c0 if res.x is not None else None
+    objbound = getattr(res, 'mip_dual_bound', None)
+    if objbound is not None:
+        objbound = m.sense*objbound + c0
+    elif res.status == 0:
+        objbound = objval
+    sol = make_sol(m, HIGHS_STATUS[res.status], objval, objbound, runtime, res.x, build_time, A.nnz,
+                   node_count=getattr(res, 'mip_node_count', None))
+    return(sol)
+
+#pywraplp result status: 0 optimal, 1 feasible (stopped at a limit), 2
+#infeasible, 3 unbounded, 4 abnormal, 5 model invalid, 6 not solved. other
+#codes count as numerical trouble
+ORTOOLS_STATUS = {0:OPTIMAL, 1:TIME_LIMIT, 2:INFEASIBLE, 3:UNBOUNDED, 4:NUMERIC, 5:NUMERIC, 6:TIME_LIMIT}
+
+def solve_ortools(m, time_limit, threads, solver_id):
+
+    from ortools.linear_solver import pywraplp
+
+    start = time.time()
+    c, c0, A, senses, b, lb, ub, integer = m.matrices()
+    solver = pywraplp.Solver.CreateSolver(solver_id)
+    inf = solver.infinity()
+    x = [solver.Var(lb[v] if lb[v] > -INFINITY else -inf, ub[v] if ub[v] < INFINITY else inf, bool(integer[v]), "") for v in range(m.num_vars)]
+    A = A.tocsr()
+    for r in range(m.num_constrs):
+        row = solver.RowConstraint(-inf if senses[r] == '<' else b[r], inf if senses[r] == '>' else b[r], "")
+        for k in range(A.indptr[r], A.indptr[r+1]):
+            row.SetCoefficient(x[A.indices[k]], A.data[k])
+    objective = solver.Objective()
+    for v in np.nonzero(c)[0]:
+        objective.SetCoefficient(x[v], c[v])
+    objective.SetOffset(c0)
+    if m.sense == MINIMIZE:
+        objective.SetMinimization()
+    else:
+        objective.SetMaximization()
+    solver.SetTimeLimit(int(1000*time_limit))
+    solver.SetNumThreads(threads)
+    build_time = m.build_time + time.time() - start
+
+    start = time.time()
+    result = solver.Solve()
+    runtime = time.time() - start
+
+    found = result in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE)
+    objval = objective.Value() if found else None
+    objbound = objective.BestBound() if any(integer) else objval
+    sol = make_sol(m, ORTOOLS_STATUS.get(result, NUMERIC), objval, objbound, runtime, np.array([v.solution_value() for v in x]) if found else None,
+                   build_time, A.nnz, node_count=solver.nodes() if any(integer) else 0, iter_count=solver.iterations())
+    return(sol)
+
+#solves the LinearModel m on backend with the limits of the Gurobi models
+def solve(m, backend='gurobi', time_limit=600, threads=4):
+
+    if backend == 'gurobi':
+        return(solve_gurobi(m, time_limit, threads))
+    if backend == 'highs':
+        return(solve_highs(m, time_limit, threads))
+    if backend == 'scip':
+        return(solve_ortools(m, time_limit, threads, 'SCIP'))
+    raise ValueError("unknown backend {}".format(backend))
@@ -0,0 +1,174 @@
+
+import time
+from gurobipy import *
+import numpy as np
+from assignment import build_model2
+from minmax import min_max_start
+from solution import get_sol, optimize
+from warmstart import instance_hash
+
+#benders decomposition of model2. for a fixed first-stage x the rest of model2
+#(recovery y, w and the adversary duals pi, rho) is an LP whose value Q(x) is
+#convex in x, also for fractional x. the master is min eta over the binary x
+#only, O(n^2), and eta >= Q(x^) + g'(x - x^) are optimality cuts at points x^,
+#where g are the reduced costs of x in the LP with x fixed by its bounds. cuts
+#are separated as lazy constraints at integral master solutions and as user
+#cuts at the root node.
+#
+#Q grows with Gamma and shrinks with Delta, so a cut of cell (Gamma, Delta)
+#is valid for every cell (Gamma', Delta') of the same instance with
+#Gamma' >= Gamma and Delta' <= Delta. cuts are kept in a pool and reused there
+#as lazy constraints. a cut is stored once per coefficients, with the cells it
+#was found for, and the pool keeps at most max_cuts cuts per instance: beyond
+#that the cuts that were slack at the final solution of the most consecutive
+#solves are dropped first
+
+class CutPool:
+
+    def __init__(self, max_cuts=1000):
+
+        self.max_cuts = max_cuts
+        self.cuts = {}
+
+    #cut eta >= const + coef'x found for (Gamma, Delta). a cut with the
+    #coefficients of a pooled one only adds (Gamma, Delta) to its cells
+    def add(self, p_bar, p_hat, Gamma, Delta, const, coef):
+
+        cuts = self.cuts.setdefault(instance_hash(p_bar, p_hat), {})
+        key = np.round(np.append(const, coef), 6).tobytes()
+        if key not in cuts:
+            cuts[key] = {'const':const, 'coef':coef, 'cells':[], 'slack':0}
+        cut = cuts[key]
+        if not any(G <= Gamma and D >= Delta for G, D in cut['cells']):
+            cut['cells'] = [(G, D) for G, D in cut['cells'] if not (Gamma <= G and Delta >= D)] + [(Gamma, Delta)]
+        if len(cuts) > self.max_cuts:
+            #stable sort, so among equally slack cuts the oldest go first
+            for key in sorted(cuts, key=lambda key: -cuts[key]['slack'])[:len(cuts) - self.max_cuts]:
+                del cuts[key]
+
+    #cuts of the instance that are valid for (Gamma, Delta)
+    def valid(self, p_bar, p_hat, Gamma, Delta):
+
+        cuts = self.cuts.get(instance_hash(p_bar, p_hat), {})
+        return([(cut['const'], cut['coef']) for cut in cuts.values() if any(G <= Gamma and D >= Delta for G, D in cut['cells'])])
+
+    #counts for the cuts valid for (Gamma, Delta) the consecutive solves in
+    #which they were slack at the final solution (x, eta), and resets the
+    #count of the binding ones
+    def record(self, p_bar, p_hat, Gamma, Delta, x, eta):
+
+        cuts = self.cuts.get(instance_hash(p_bar, p_hat), {})
+        for cut in cuts.values():
+            if any(G <= Gamma and D >= Delta for G, D in cut['cells']):
+                slack = eta - cut['const'] - cut['coef'] @ x > 1e-6*max(1, abs(eta))
+                cut['slack'] = cut['slack'] + 1 if slack else 0
+
+#shared pool, used when benders is not given one
+cut_pool = CutPool()
+
+#the LP of model2 for fixed x: x is continuous and fixed through its bounds
+def build_subproblem(p_bar, p_hat, Gamma, Delta, env=None):
+
+    model, var = build_model2(p_bar, p_hat, Gamma, Delta, GRB.INFINITY, threads=1, name="model2_subproblem", env=env)
+    model.setParam("OutputFlag", 0)
+    x = list(var['x'].values())
+    model.setAttr("VType", x, [GRB.CONTINUOUS]*len(x))
+
+    return(model, x)
+
+#value Q(x^) and subgradient g of the subproblem at x^ (flat, as the x keys)
+def solve_subproblem(sub, x, x_hat):
+
+    sub.setAttr("LB", x, x_hat)
+    sub.setAttr("UB", x, x_hat)
+    sub.optimize()
+
+    return(sub.ObjVal, np.asarray(sub.getAttr("RC", x)))
+
+#adds the cut at x^ through add (model.addConstr, cbLazy or cbCut) and to the pool
+def add_cut(model, add, x_hat):
+
+    start = time.time()
+    b = model._benders
+    Q, g = solve_subproblem(b['sub'], b['sub_x'], x_hat)
+    const = Q - g @ np.asarray(x_hat)
+    b['subproblems'] += 1
+    b['time'] += time.time() - start
+
+    eta_hat = model.cbGetSolution(b['eta']) if add == model.cbLazy else model.cbGetNodeRel(b['eta']) if add == model.cbCut else None
+    if eta_hat is not None and eta_hat >= Q - 1e-6*max(1, abs(Q)):
+        return(Q)
+    nz = np.nonzero(np.abs(g) > 1e-9)[0]
+    add(b['eta'] >= const + LinExpr(g[nz].tolist(), [b['x'][k] for k in nz]))
+    b['pool'].add(*b['instance'], const, g)
+    b['cuts'] += 1
+
+    return(Q)
+
+def separate(model, where):
+
+    b = model._benders
+    if where == GRB.Callback.MIPSOL:
+        add_cut(model, model.cbLazy, model.cbGetSolution(b['x']))
+    elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL \
+            and model.cbGet(GRB.Callback.MIPNODE_NODCNT) == 0 and b['root_rounds'] > 0:
+        b['root_rounds'] -= 1
+        add_cut(model, model.cbCut, model.cbGetNodeRel(b['x']))
+
+def benders(p_bar, p_hat, Gamma, Delta, time_limit, threads=4, pool=None, root_rounds=20, env=None):
+
+    n = len(p_bar)
+    N = [i for i in range(n)]
+    if pool is None:
+        pool = cut_pool
+
+    start = time.time()
+    model = Model("model2_benders", env=env)
+    model.setParam("OutputFlag", 0)
+    model.setParam("TimeLimit", time_limit)
+    model.setParam("Threads", threads)
+    model.setParam("LazyConstraints", 1)
+    model.setParam("PreCrush", 1)
+
+    #variables
+    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
+    eta = model.addVar(vtype=GRB.CONTINUOUS, name="eta", lb=0)
+
+    #objective
+    model.setObjective(eta, GRB.MINIMIZE)
+
+    #constraints
+    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
+    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
+
+    xs = list(x.values())
+    sub, sub_x = build_subproblem(p_bar, p_hat, Gamma, Delta, env)
+    model._benders = {'x':xs, 'eta':eta, 'sub':sub, 'sub_x':sub_x, 'pool':pool, 'instance':(p_bar, p_hat, Gamma, Delta),
+                      'root_rounds':root_rounds, 'cuts':0, 'subproblems':0, 'time':0.0}
+
+    #cuts of earlier cells of the instance, as lazy constraints
+    reused = pool.valid(p_bar, p_hat, Gamma, Delta)
+    lazy = []
+    for const, g in reused:
+        nz = np.nonzero(np.abs(g) > 1e-9)[0]
+        lazy.append(model.addConstr(eta >= const + LinExpr(g[nz].tolist(), [xs[k] for k in nz])))
+    model.setAttr("Lazy", lazy, [1]*len(lazy))
+
+    #min-max schedule as warmstart, with its cut
+    perm = min_max_start(p_bar, p_hat, Gamma)['perm']
+    x_hat = [1.0 if perm[j] == i else 0.0 for i, j in x.keys()]
+    Q = add_cut(model, model.addConstr, x_hat)
+    model.setAttr("Start", xs, x_hat)
+    eta.start = Q
+    model._build_time = time.time() - start
+
+    optimize(model, separate)
+    if model.SolCount > 0:
+        pool.record(p_bar, p_hat, Gamma, Delta, np.asarray(model.getAttr("X", xs)), eta.X)
+
+    sol = get_sol(model)
+    sol['cuts'] = model._benders['cuts']
+    sol['reused_cuts'] = len(reused)
+    sol['subproblems'] = model._benders['subproblems']
+    sol['subproblem_time'] = model._benders['time']
+    return(sol)
@@ -0,0 +1,151 @@
+
+from functools import lru_cache
+import time
+from gurobipy import *
+import numpy as np
+import scipy.sparse as sp
+from minmax import min_max_start
+from recovery import recovery_lp
+from solution import optimize, statistics
+
+#column-and-constraint generation for min_x max_delta min_y of the cost of
+#schedule x under deviation delta and recovery y, where y is the fractional
+#matching of model3 (sum_{e ni i} y[e] <= 1, sum_e y[e] <= Delta), so the
+#algorithm converges to the optimal value of model3.
+#
+#the master is min eta over x with one block of recovery variables y, u, v
+#per scenario found so far and eta >= the recovered cost of each scenario,
+#so its size grows with the scenarios instead of with a fixed K. for the
+#master schedule the subproblem max_delta min_y is the LP recovery_lp, whose
+#duals give the worst deviation delta; its value is an upper bound, the
+#master bound a lower bound, and the loop stops when they meet
+
+#relative gap at which the bounds count as equal, Gurobi's default MIPGap
+GAP = 1e-4
+
+#index maps of a scenario block, flat variables as in model3_matrix: x[i,l] at
+#i*n + l and u/v[e,l] at e*n + l
+@lru_cache(maxsize=None)
+def maps(n):
+
+    E0, E1 = np.triu_indices(n, 1)
+    m = len(E0)
+    U = np.arange(m*n)
+    e_of, l_of = U//n, U % n
+    uv_to_y = sp.csr_matrix((np.ones(m*n), (U, e_of)), shape=(m*n, m))
+    u_to_x = sp.csr_matrix((np.ones(m*n), (U, E0[e_of]*n + l_of)), shape=(m*n, n*n))
+    v_to_x = sp.csr_matrix((np.ones(m*n), (U, E1[e_of]*n + l_of)), shape=(m*n, n*n))
+    incidence = sp.csr_matrix((np.ones(2*m), (np.concatenate([E0, E1]), np.tile(np.arange(m), 2))), shape=(n, m))
+
+    return({'E0':E0, 'E1':E1, 'm':m, 'e_of':e_of, 'l_of':l_of, 'uv_to_y':uv_to_y, 'u_to_x':u_to_x, 'v_to_x':v_to_x, 'incidence':incidence})
+
+def build_master(n, time_limit, threads=4, env=None):
+
+    start = time.time()
+    model = Model("ccg_master", env=env)
+    model.setParam("OutputFlag", 0)
+    model.setParam("TimeLimit", time_limit)
+    model.setParam("Threads", threads)
+
+    Y = np.arange(n*n)
+    row_sum = sp.csr_matrix((np.ones(n*n), (Y//n, Y)), shape=(n, n*n))
+    col_sum = sp.csr_matrix((np.ones(n*n), (Y % n, Y)), shape=(n, n*n))
+
+    #variables
+    x = model.addMVar(n*n, vtype=GRB.BINARY, name="x")
+    eta = model.addVar(vtype=GRB.CONTINUOUS, name="eta", lb=0)
+
+    #objective
+    model.setObjective(eta, GRB.MINIMIZE)
+
+    #constraints
+    model.addConstr(col_sum @ x == 1)
+    model.addConstr(row_sum @ x == 1)
+
+    model._build_time = time.time() - start
+    return(model, x, eta)
+
+#adds the recovery block of scenario p (processing times p_bar + delta*p_hat).
+#u[e,l] and v[e,l] stand for y[e]*x[e[0],l] and y[e]*x[e[1],l] and only occur
+#in the cost row of this scenario, each with a fixed sign, so only the
+#McCormick inequalities that bound them against that sign are needed: lower
+#bounds for a positive coefficient and upper bounds for a negative one
+def add_scenario(model, x, eta, p, Delta, s):
+
+    n = len(p)
+    mp = maps(n)
+    m, e_of, l_of = mp['m'], mp['e_of'], mp['l_of']
+
+    y = model.addMVar(m, vtype=GRB.CONTINUOUS, name="y_{}".format(s), lb=0)
+    u = model.addMVar(m*n, vtype=GRB.CONTINUOUS, name="u_{}".format(s), lb=0)
+    v = model.addMVar(m*n, vtype=GRB.CONTINUOUS, name="v_{}".format(s), lb=0)
+
+    #cost coefficients as in model3_matrix
+    c_x = np.tile(np.arange(n), n).astype(float)*np.repeat(p, n)
+    c_v = l_of*(p[mp['E1']] - p[mp['E0']])[e_of]
+
+    model.addConstr(eta + c_x @ x - c_v @ v + c_v @ u >= (n+1)*p.sum())
+    model.addConstr(mp['incidence'] @ y <= 1)
+    model.addConstr(y.sum() <= Delta)
+    for w, c, to_x in [(u, -c_v, mp['u_to_x']), (v, c_v, mp['v_to_x'])]:
+        up, low = np.nonzero(c < 0)[0], np.nonzero(c > 0)[0]
+        model.addConstr(w[up] - to_x[up] @ x <= 0)
+        model.addConstr(w[up] - mp['uv_to_y'][up] @ y <= 0)
+        model.addConstr(w[low] - mp['uv_to_y'][low] @ y - to_x[low] @ x >= -1)
+
+def ccg(p_bar, p_hat, Gamma, Delta, time_limit, threads=4, max_iter=1000, env=None):
+
+    begin = time.time()
+    n = len(p_bar)
+    p_bar = np.asarray(p_bar, dtype=float)
+    p_hat = np.asarray(p_hat, dtype=float)
+
+    model, x, eta = build_master(n, time_limit, threads, env)
+
+    #costs are nonnegative, so 0 is the first lower bound
+    lb, ub = 0.0, GRB.INFINITY
+    perm = min_max_start(p_bar, p_hat, Gamma)['perm']
+    history = []
+    iteration = 0
+    #node and simplex iteration counts and wall time of all master solves
+    masters = {'solves':0, 'node_count':0, 'iter_count':0, 'optimize_time':0.0}
+    while True:
+        #subproblem for the current schedule
+        sub = recovery_lp(p_bar, p_hat, Gamma, Delta, perm)
+        if sub['objval'] < ub:
+            ub, best = sub['objval'], list(perm)
+        history.append({'iteration':iteration, 'lb':lb, 'ub':ub, 'time':time.time() - begin})
+
+        remaining = time_limit - (time.time() - begin)
+        if ub - lb <= GAP*abs(ub):
+            status = GRB.OPTIMAL
+            break
+        if remaining <= 0:
+            status = GRB.TIME_LIMIT
+            break
+        if iteration == max_iter:
+            status = GRB.ITERATION_LIMIT
+            break
+
+        #master with the worst deviation of the subproblem as new scenario
+        delta = np.clip(sub['delta'], 0, 1)
+        add_scenario(model, x, eta, p_bar + delta*p_hat, Delta, iteration)
+        model.setParam("TimeLimit", remaining)
+        optimize(model)
+        masters['solves'] += 1
+        masters['node_count'] += int(model.NodeCount)
+        masters['iter_count'] += int(model.IterCount)
+        masters['optimize_time'] += model._optimize_time
+        if model.SolCount == 0:
+            status = model.Status
+            break
+        lb = max(lb, model.ObjBound)
+        perm = np.argmax(x.X.reshape(n, n), axis=0).tolist()
+        iteration += 1
+
+    sol = {'status':status, 'objbound':lb, 'objval':ub, 'mipgap':max(0, ub - lb)/abs(ub), 'runtime':time.time() - begin,
+           'iterations':iteration, 'perm':best, 'history':history}
+    #sizes are those of the last master
+    if masters['solves'] > 0:
+        sol.update(statistics(model), node_count=masters['node_count'], iter_count=masters['iter_count'], optimize_time=masters['optimize_time'])
+    return(sol)
@@ -0,0 +1,153 @@
+
+from fractions import Fraction
+import time
+from ortools.sat.python import cp_model
+from formulations import solve_formulation
+from memory import peak_rss
+from minmax import min_max_start
+
+#native CP-SAT model of model1. the schedule is a permutation, pos[i] the
+#position of job i and job[j] the job in position j (AddInverse, with
+#AddAllDifferent on pos). recovery k is an involution partner[k] (AddInverse
+#of partner[k] with itself), job i takes the position of its partner
+#(AddElement) and at least n - 2*Delta jobs stay in place. the mixing
+#weights mu[k] of model1 are discretised to multiples of 1/steps, so for
+#K > 1 the model is model1 with mu on a grid and its value an upper bound of
+#model1; for K = 1 it is exact. the bound CP-SAT proves for K > 1 is one of
+#the restricted model, so cpsat() reports the max-min lower bound instead and
+#only claims optimality where the two meet.
+#
+#CP-SAT needs integer coefficients: the processing times are scaled to
+#integers, Gamma is written as a fraction num/den and the objective is
+#scale*den*steps times that of model1. with integer weights the optimal
+#adversary duals pi, rho are integers (pi is 0 or a breakpoint
+#p_hat[i]*weight), so the scaling is exact. CP-SAT runs its portfolio of
+#threads search workers
+
+#largest power of 10 that CP-SAT processing times are scaled by
+MAX_SCALE = 10**6
+
+#smallest power of 10 that makes all values integral
+def integer_scale(values):
+
+    scale = 1
+    while scale < MAX_SCALE and any(abs(v*scale - round(v*scale)) > 1e-9 for v in values):
+        scale *= 10
+    return(scale)
+
+#CpSolver status onto Gurobi's status codes
+STATUS = {cp_model.OPTIMAL:2, cp_model.INFEASIBLE:3, cp_model.FEASIBLE:9, cp_model.UNKNOWN:9, cp_model.MODEL_INVALID:12}
+
+def build_cpsat(p_bar, p_hat, Gamma, Delta, K, steps=12):
+
+    start = time.time()
+    n = len(p_bar)
+    N = [i for i in range(n)]
+    K = [k for k in range(K)]
+    if len(K) == 1:
+        steps = 1
+    perm = min_max_start(p_bar, p_hat, Gamma)['perm']
+    scale = integer_scale(list(p_bar) + list(p_hat))
+    p_bar = [int(round(scale*p)) for p in p_bar]
+    p_hat = [int(round(scale*p)) for p in p_hat]
+    gamma = Fraction(Gamma).limit_denominator(1000)
+
+    model = cp_model.CpModel()
+
+    #sequence
+    pos = [model.NewIntVar(0, n-1, "pos[{}]".format(i)) for i in N]
+    job = [model.NewIntVar(0, n-1, "job[{}]".format(j)) for j in N]
+    model.AddAllDifferent(pos)
+    model.AddInverse(pos, job)
+
+    #recoveries and mixing weights, mu in units of 1/steps, ordered to break
+    #the symmetry between the recoveries
+    partner = [[model.NewIntVar(0, n-1, "partner[{},{}]".format(k, i)) for i in N] for k in K]
+    fixed = [[model.NewBoolVar("fixed[{},{}]".format(k, i)) for i in N] for k in K]
+    new_pos = [[model.NewIntVar(0, n-1, "new_pos[{},{}]".format(k, i)) for i in N] for k in K]
+    mu = [model.NewIntVar(0, steps, "mu[{}]".format(k)) for k in K]
+    #q[k][i] = mu[k]*new_pos[k][i]
+    q = [[model.NewIntVar(0, steps*(n-1), "q[{},{}]".format(k, i)) for i in N] for k in K]
+    for k in K:
+        model.AddInverse(partner[k], partner[k])
+        for i in N:
+            model.Add(partner[k][i] == i).OnlyEnforceIf(fixed[k][i])
+            model.Add(partner[k][i] != i).OnlyEnforceIf(fixed[k][i].Not())
+            model.AddElement(partner[k][i], pos, new_pos[k][i])
+            model.AddMultiplicationEquality(q[k][i], [mu[k], new_pos[k][i]])
+        model.Add(sum(fixed[k]) >= n - 2*Delta)
+    model.Add(sum(mu) == steps)
+    for k in K[1:]:
+        model.Add(mu[k-1] >= mu[k])
+
+    #adversary duals, per unit of 1/steps. job i has weight n+1-new_pos[k][i]
+    #under recovery k, so its mixed weight times steps is
+    #(n+1)*steps - sum_k q[k][i]
+    bound = max(p_hat)*(n+1)*steps
+    pi = model.NewIntVar(0, bound, "pi")
+    rho = [model.NewIntVar(0, bound, "rho[{}]".format(i)) for i in N]
+    for i in N:
+        model.Add(pi + rho[i] >= p_hat[i]*((n+1)*steps - sum(q[k][i] for k in K)))
+
+    #objective, scale*den*steps times that of model1
+    nominal = sum(p_bar[i]*((n+1)*steps - sum(q[k][i] for k in K)) for i in N)
+    model.Minimize(gamma.denominator*nominal + gamma.numerator*pi + gamma.denominator*sum(rho))
+
+    #min-max schedule without recovery as hint
+    for j, i in enumerate(perm):
+        model.AddHint(pos[i], j)
+        model.AddHint(job[j], i)
+        for k in K:
+            model.AddHint(partner[k][i], i)
+            model.AddHint(new_pos[k][i], j)
+            model.AddHint(q[k][i], j*steps if k == 0 else 0)
+    for k in K:
+        model.AddHint(mu[k], steps if k == 0 else 0)
+
+    var = {'pos':pos, 'job':job, 'partner':partner, 'mu':mu, 'pi':pi, 'rho':rho, 'divisor':scale*gamma.denominator*steps,
+           'build_time':time.time() - start}
+    return(model, var)
+
+#solves the CP-SAT model. sol has the fields of assignment.model2 and the
+#statistics of solution.py that CP-SAT reports, with the schedule under
+#'perm' (perm[j] is the job in position j)
+def cpsat(p_bar, p_hat, Gamma, Delta, K, time_limit, threads=4, steps=12):
+
+    model, var = build_cpsat(p_bar, p_hat, Gamma, Delta, K, steps)
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.num_workers = threads
+
+    start = time.time()
+    status = solver.Solve(model)
+    optimize_time = time.time() - start
+
+    found = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    divisor = var['divisor']
+    objval = solver.ObjectiveValue()/divisor if found else 1e100
+    objbound = solver.BestObjectiveBound()/divisor
+    status = STATUS[status]
+    bound_time = 0.0
+    #mu on a grid, the optimum and bound of CP-SAT are not those of model1
+    if K > 1:
+        #a CP-SAT schedule is feasible for model1, so it is optimal only
+        #once it meets the max-min bound. the bound is solved within what is
+        #left of time_limit, a feasible value of the max-min LP is a bound too
+        remaining = time_limit - (time.time() - start)
+        objbound = -1e100
+        if remaining > 0:
+            bound_start = time.time()
+            objbound = solve_formulation('max_min', 'highs', p_bar, p_hat, Gamma, Delta, remaining)['objval']
+            bound_time = time.time() - bound_start
+        if found and objval - objbound <= 1e-4*abs(objval):
+            status = 2
+        elif status == 2:
+            status = 9
+    proto = model.Proto()
+    sol = {'status':status, 'objbound':objbound, 'objval':objval, 'mipgap':max(0, objval - objbound)/abs(objval) if found and objval != 0 else 1e100,
+           'runtime':solver.WallTime() + bound_time, 'build_time':var['build_time'], 'optimize_time':optimize_time + bound_time,
+           'num_vars':len(proto.variables), 'num_constrs':len(proto.constraints), 'num_nzs':None,
+           'presolved_vars':None, 'presolved_constrs':None, 'presolved_nzs':None, 'node_count':solver.NumBranches(), 'iter_count':None,
+           'peak_rss_mb':peak_rss(),
+           'perm':[solver.Value(j) for j in var['job']] if found else None}
+    return(sol)
@@ -0,0 +1,201 @@
+import time
+from backend import INFINITY, MAXIMIZE, LinearModel, solve, value
+from preprocessing import add_precedence, allowed
+
+#the formulations, written once against the modelling interface of
+#backend.py. each function adds its variables, objective and constraints to
+#m and returns its var dict. m is a LinearModel for the backends of
+#backend.solve, or a GurobiModel around the gurobipy Model of build_min_max,
+#worst_case_scenario, build_model1, build_model2 and build_model3, which add
+#the Gurobi parameters, MIP starts, callbacks and the model cache on top.
+#with the result pre of preprocessing.dominance, the x outside the position
+#windows and the products with them are not built and the jobs are ordered
+#by the precedences; var['eliminated'] counts the variables left out
+
+FORMULATIONS = ['min_max', 'max_min', 'model1', 'model2', 'model3']
+
+def min_max(m, p_bar, p_hat, Gamma):
+
+    n = len(p_bar)
+    N = [i for i in range(n)]
+
+    #variables
+    x = m.add_vars([(i,j) for i in N for j in N], ub=1, integer=True, name="x")
+    pi = m.add_var(name="pi")
+    rho = m.add_vars([i for i in N], name="rho")
+
+    #objective
+    m.set_objective(m.sum(p_bar[i]*(n+1-j)*x[i,j] for i in N for j in N) + Gamma*pi + m.sum(rho[i] for i in N))
+
+    #constraints
+    m.add_constrs(pi + rho[i] >= m.sum(p_hat[i]*(n+1-j)*x[i,j] for j in N) for i in N)
+    m.add_constrs(m.sum(x[i,j] for i in N) == 1 for j in N)
+    m.add_constrs(m.sum(x[i,j] for j in N) == 1 for i in N)
+
+    return({'x':x, 'pi':pi, 'rho':rho})
+
+#the worst-case scenario LP of maxmin.py, whose value is the max-min lower bound
+def max_min(m, p_bar, p_hat, Gamma):
+
+    n = len(p_bar)
+    N = [i for i in range(n)]
+
+    #variables
+    alpha = m.add_vars([j for j in N], lb=-INFINITY, name="alpha")
+    beta = m.add_vars([i for i in N], lb=-INFINITY, name="beta")
+    delta = m.add_vars([i for i in N], ub=1, name="delta")
+
+    #objective
+    m.set_objective(m.sum(alpha[j] for j in N) + m.sum(beta[i] for i in N), MAXIMIZE)
+
+    #constraints
+    m.add_constrs(alpha[j] + beta[i] <= (p_bar[i] + delta[i]*p_hat[i])*(n+1-j) for i in N for j in N)
+    m.add_constr(m.sum(delta[i] for i in N) <= Gamma)
+
+    return({'alpha':alpha, 'beta':beta, 'delta':delta})
+
+#the constraints whose right-hand side depends on Delta are under 'recovery'
+def model1(m, p_bar, p_hat, Gamma, Delta, K, pre=None):
+
+    n = len(p_bar)
+    N = [i for i in range(n)]
+    K = [k for k in range(K)]
+    X = allowed(n, pre)
+
+    #variables
+    x = m.add_vars([(i,j) for i in N for j in N if (i,j) in X], ub=1, integer=True, name="x")
+    z = m.add_vars([(i,j,k) for i in N for j in N for k in K if i <= j], ub=1, integer=True, name="z")
+    w = m.add_vars([(i,j,l,k) for i in N for j in N for l in N for k in K if (l,j) in X], ub=1, integer=True, name="w")
+    h = m.add_vars([(i,j,l,k) for i in N for j in N for l in N for k in K if (l,j) in X], name="h")
+    mu = m.add_vars([k for k in K], name="mu")
+    pi = m.add_var(name="pi")
+    rho = m.add_vars([i for i in N], name="rho")
+
+    #recoveries are symmetric, so z is only indexed by i <= j and zs[i,j,k]
+    #is z[i,j,k] for either order of i and j
+    zs = {(i,j,k):z[min(i,j),max(i,j),k] for i in N for j in N for k in K}
+
+    #objective
+    m.set_objective(m.sum(m.sum(p_bar[i]*(n-j+1)*m.sum(h[i,j,l,k] for l in N if (l,j) in X) for i in N for j in N) for k in K) + Gamma*pi + m.sum(rho[i] for i in N))
+
+    #constraints
+    m.add_constr(m.sum(mu[k] for k in K) == 1)
+    m.add_constrs(pi + rho[i] >= m.sum(m.sum(p_hat[i]*(n-j+1)*m.sum(h[i,j,l,k] for l in N if (l,j) in X) for j in N) for k in K) for i in N)
+    m.add_constrs(m.sum(zs[i,j,k] for j in N) == 1 for i in N for k in K)
+    recovery = m.add_constrs(m.sum(z[i,i,k] for i in N) >= n - 2*Delta for k in K)
+    m.add_constrs(w[i,j,l,k] <= zs[i,l,k] for (i,j,l,k) in w.keys())
+    m.add_constrs(w[i,j,l,k] <= x[l,j] for (i,j,l,k) in w.keys())
+    m.add_constrs(w[i,j,l,k] >= x[l,j] + zs[i,l,k] - 1 for (i,j,l,k) in w.keys())
+    m.add_constrs(h[i,j,l,k] <= w[i,j,l,k] for (i,j,l,k) in w.keys())
+    m.add_constrs(h[i,j,l,k] <= mu[k] for (i,j,l,k) in w.keys())
+    m.add_constrs(h[i,j,l,k] >= mu[k] - (1-w[i,j,l,k]) for (i,j,l,k) in w.keys())
+    m.add_constrs(m.sum(x[i,j] for i in N if (i,j) in X) == 1 for j in N)
+    m.add_constrs(m.sum(x[i,j] for j in N if (i,j) in X) == 1 for i in N)
+    add_precedence(m, x, pre)
+
+    return({'x':x, 'z':z, 'zs':zs, 'w':w, 'h':h, 'mu':mu, 'pi':pi, 'rho':rho, 'recovery':recovery, 'eliminated':n*n - len(x) + 2*(n**3*len(K) - len(w))})
+
+#the constraint whose right-hand side depends on Delta is under 'recovery'
+def model2(m, p_bar, p_hat, Gamma, Delta, pre=None):
+
+    n = len(p_bar)
+    N = [i for i in range(n)]
+    X = allowed(n, pre)
+
+    #variables
+    x = m.add_vars([(i,j) for i in N for j in N if (i,j) in X], ub=1, integer=True, name="x")
+    y = m.add_vars([(i,j) for i in N for j in N], ub=1, name="y")
+    w = m.add_vars([(i,j,l) for i in N for j in N for l in N if (j,l) in X], name="w")
+    pi = m.add_var(name="pi")
+    rho = m.add_vars([i for i in N], name="rho")
+
+    #objective
+    m.set_objective(m.sum((n+1)*p_bar[i]*y[i,j] - m.sum(w[i,j,l]*p_bar[i]*l for l in N if (j,l) in X) for i in N for j in N) + Gamma*pi + m.sum(rho[i] for i in N))
+
+    #constraints
+    m.add_constrs(m.sum(y[i,j] for i in N) == 1 for j in N)
+    m.add_constrs(m.sum(y[i,j] for j in N) == 1 for i in N)
+    recovery = m.add_constr(m.sum(y[i,i] for i in N) >= n - 2*Delta)
+    m.add_constrs(y[i,j] == y[j,i] for i in N for j in N)
+    m.add_constrs(pi + rho[i] >= m.sum((n+1)*p_hat[i]*y[i,j] - m.sum(w[i,j,l]*p_hat[i]*l for l in N if (j,l) in X) for j in N) for i in N)
+    m.add_constrs(w[i,j,l] <= x[j,l] for (i,j,l) in w.keys())
+    m.add_constrs(w[i,j,l] <= y[i,j] for (i,j,l) in w.keys())
+    m.add_constrs(w[i,j,l] >= y[i,j] - (1-x[j,l]) for (i,j,l) in w.keys())
+    m.add_constrs(m.sum(x[i,j] for i in N if (i,j) in X) == 1 for j in N)
+    m.add_constrs(m.sum(x[i,j] for j in N if (i,j) in X) == 1 for i in N)
+    add_precedence(m, x, pre)
+
+    return({'x':x, 'y':y, 'w':w, 'pi':pi, 'rho':rho, 'recovery':recovery, 'eliminated':n*n - len(x) + n**3 - len(w)})
+
+#the constraint whose right-hand side depends on Delta is under 'recovery'
+def model3(m, p_bar, p_hat, Gamma, Delta, pre=None):
+
+    n = len(p_bar)
+    N = [i for i in range(n)]
+    X = allowed(n, pre)
+    E = [(i,j) for i in N for j in N if j>i]
+
+    #variables
+    x = m.add_vars([(i,j) for i in N for j in N if (i,j) in X], ub=1, integer=True, name="x")
+    y = m.add_vars([e for e in E], name="y")
+    pi = m.add_var(name="pi")
+    rho = m.add_vars([i for i in N], name="rho")
+    u = m.add_vars([(i,j,l) for (i,j) in E for l in N if (i,l) in X], name="u")
+    v = m.add_vars([(i,j,l) for (i,j) in E for l in N if (j,l) in X], name="v")
+
+    #sum_l l*x[i,l] and sum_l l*(v[e,l] - u[e,l]), the position of job i and the
+    #change of position of e[0] by the swap e
+    pos = {i:m.sum(x[i,l]*l for l in N if (i,l) in X) for i in N}
+    move = {e:m.sum(v[e[0],e[1],l]*l for l in N if (e[1],l) in X) - m.sum(u[e[0],e[1],l]*l for l in N if (e[0],l) in X) for e in E}
+
+    #objective
+    m.set_objective(m.sum(p_bar[i]*(n+1-pos[i]) for i in N) + m.sum(p_bar[e[1]]*move[e] - p_bar[e[0]]*move[e] for e in E) + Gamma*pi + m.sum(rho[i] for i in N))
+
+    #constraints
+    m.add_constrs(rho[i] + pi + m.sum(p_hat[e[0]]*move[e] for e in E if e[0] == i) - m.sum(p_hat[e[1]]*move[e] for e in E if e[1] == i) >= p_hat[i]*(n+1-pos[i]) for i in N)
+    m.add_constrs(m.sum(y[e] for e in E if (e[0] == i) or (e[1] == i)) <= 1 for i in N)
+    recovery = m.add_constr(m.sum(y[e] for e in E) <= Delta)
+    m.add_constrs(u[e[0],e[1],l] <= x[e[0],l] for e in E for l in N if (e[0],l) in X)
+    m.add_constrs(u[e[0],e[1],l] <= y[e[0],e[1]] for e in E for l in N if (e[0],l) in X)
+    m.add_constrs(u[e[0],e[1],l] >= y[e[0],e[1]] - (1-x[e[0],l]) for e in E for l in N if (e[0],l) in X)
+    m.add_constrs(v[e[0],e[1],l] <= x[e[1],l] for e in E for l in N if (e[1],l) in X)
+    m.add_constrs(v[e[0],e[1],l] <= y[e[0],e[1]] for e in E for l in N if (e[1],l) in X)
+    m.add_constrs(v[e[0],e[1],l] >= y[e[0],e[1]] - (1-x[e[1],l]) for e in E for l in N if (e[1],l) in X)
+    m.add_constrs(m.sum(x[i,j] for i in N if (i,j) in X) == 1 for j in N)
+    m.add_constrs(m.sum(x[i,j] for j in N if (i,j) in X) == 1 for i in N)
+    add_precedence(m, x, pre)
+
+    return({'x':x, 'y':y, 'u':u, 'v':v, 'pi':pi, 'rho':rho, 'recovery':recovery, 'eliminated':n*n - len(x) + 2*len(E)*n - len(u) - len(v)})
+
+#the formulation as a LinearModel for the backends of backend.solve
+def build(formulation, p_bar, p_hat, Gamma, Delta=0, K=2):
+
+    start = time.time()
+    m = LinearModel(formulation)
+    if formulation == 'min_max':
+        var = min_max(m, p_bar, p_hat, Gamma)
+    elif formulation == 'max_min':
+        var = max_min(m, p_bar, p_hat, Gamma)
+    elif formulation == 'model1':
+        var = model1(m, p_bar, p_hat, Gamma, Delta, K)
+    elif formulation == 'model2':
+        var = model2(m, p_bar, p_hat, Gamma, Delta)
+    elif formulation == 'model3':
+        var = model3(m, p_bar, p_hat, Gamma, Delta)
+    else:
+        raise ValueError("unknown formulation {}".format(formulation))
+
+    m.build_time = time.time() - start
+    return(m, var)
+
+#solves a formulation on backend. sol is that of backend.solve, with the
+#schedule under 'perm' (perm[j] is the job in position j) if one was found
+def solve_formulation(formulation, backend, p_bar, p_hat, Gamma, Delta, time_limit, K=2, threads=4):
+
+    n = len(p_bar)
+    m, var = build(formulation, p_bar, p_hat, Gamma, Delta, K)
+    sol = solve(m, backend, time_limit, threads)
+    if 'x' in var and sol['solution'] is not None:
+        sol['perm'] = [max(range(n), key=lambda i:value(var['x'][i,j], sol)) for j in range(n)]
+
+    return(sol)
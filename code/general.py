@@ -1,102 +1,157 @@
 from gurobipy import *
+from adversary import adv_dual, adv_perm
+from backend import GurobiModel
+import formulations
+from minmax import min_max_start
+from preprocessing import dominance
+from recovery import pattern, recovery_lp
+from solution import get_sol, optimize, optimize_from_start, start_lists
+import numpy as np
+import time
+
+#builds model1 of formulations.model1 without solving it. returns the model
+#and its variables, plus the constraints whose right-hand side depends on
+#Delta under 'recovery'. with the result pre of preprocessing.dominance,
+#x[l,j] outside the position windows and w[i,j,l,k], h[i,j,l,k] (products
+#with x[l,j]) are not built and the jobs are ordered by the precedences;
+#var['eliminated'] counts the variables left out
+def build_model1(p_bar, p_hat, Gamma, Delta, K, time_limit, threads=4, name="model1", pre=None, env=None):
+
+    start = time.time()
+    model = Model(name, env=env)
+    model.setParam("TimeLimit", time_limit)
+    model.setParam("Threads", threads)
 
-def model1(p_bar, p_hat, Gamma, Delta, K, time_limit):
+    var = formulations.model1(GurobiModel(model), p_bar, p_hat, Gamma, Delta, K, pre)
+    model._build_time = time.time() - start
+    return(model, var)
 
-    n = len(p_bar)
-    N = [i for i in range(n)]
-    K = [k for k in range(K)]
+def model1(p_bar, p_hat, Gamma, Delta, K, time_limit, threads=4, preprocess=False, env=None):
 
-    model = Model("model1")
+    #dominance preprocessing, see preprocessing.py
+    pre = dominance(p_bar, p_hat, Gamma, Delta) if preprocess else None
+    model, var = build_model1(p_bar, p_hat, Gamma, Delta, K, time_limit, threads, pre=pre, env=env)
     model.setParam("OutputFlag", 0)
-    model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
-    
-    #variables
-    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    z = model.addVars([(i,j,k) for i in N for j in N for k in K], vtype=GRB.BINARY, name="z")
-    w = model.addVars([(i,j,l,k) for i in N for j in N for l in N for k in K], vtype=GRB.BINARY, name="w")
-    h = model.addVars([(i,j,l,k) for i in N for j in N for l in N for k in K], vtype=GRB.CONTINUOUS, lb=0, name="h")
-    mu = model.addVars([k for k in K], vtype=GRB.CONTINUOUS, name="mu", lb=0)
-    pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
-    rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
-
-    #objective
-    model.setObjective(quicksum(quicksum(p_bar[i]*(n-j+1)*quicksum(h[i,j,l,k] for l in N) for i in N for j in N) for k in K) + Gamma*pi + quicksum(rho[i] for i in N), GRB.MINIMIZE)
-
-    #constraints
-    model.addConstr(quicksum(mu[k] for k in K) == 1)
-    model.addConstrs(pi + rho[i] >= quicksum(quicksum(p_hat[i]*(n-j+1)*quicksum(h[i,j,l,k] for l in N) for j in N) for k in K) for i in N)
-    model.addConstrs(quicksum(z[i,j,k] for i in N) == 1 for j in N for k in K)
-    model.addConstrs(quicksum(z[i,j,k] for j in N) == 1 for i in N for k in K)
-    model.addConstrs(z[i,j,k] == z[j,i,k] for i in N for j in N for k in K)
-    model.addConstrs(quicksum(z[i,i,k] for i in N) >= n - 2*Delta for k in K)
-    model.addConstrs(w[i,j,l,k] <= z[i,l,k] for i in N for j in N for l in N for k in K)
-    model.addConstrs(w[i,j,l,k] <= x[l,j] for i in N for j in N for l in N for k in K)
-    model.addConstrs(w[i,j,l,k] >= x[l,j] + z[i,l,k] - 1 for i in N for j in N for l in N for k in K)
-    model.addConstrs(h[i,j,l,k] <= w[i,j,l,k] for i in N for j in N for l in N for k in K)
-    model.addConstrs(h[i,j,l,k] <= mu[k] for i in N for j in N for l in N for k in K)
-    model.addConstrs(h[i,j,l,k] >= mu[k] - (1-w[i,j,l,k]) for i in N for j in N for l in N for k in K)
-    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
 
-    model.optimize()
+    optimize(model)
 
-    sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':model.ObjVal, 'mipgap':model.MIPGap, 'runtime':model.Runtime}
+    sol = get_sol(model)
+    sol['eliminated'] = var['eliminated']
 #    model.write("model1.sol")
     return(sol)
 
-def model1_ws(p_bar, p_hat, Gamma, Delta, K, time_limit):
+#integral recovery of the schedule perm (perm[j] is the job in position j):
+#the better of no swaps and the optimal swaps of recovery_lp rounded greedily
+#to a matching of at most Delta pairs. returns partner, where partner[i] is
+#the job that i swaps with, the recovered schedule and its worst-case cost,
+#which is the objective value of model1 for this recovery
+def integral_recovery(p_bar, p_hat, Gamma, Delta, perm):
 
     n = len(p_bar)
-    N = [i for i in range(n)]
-    K = [k for k in range(K)]
+    perm = np.asarray(perm)
+    pos = np.empty(n, dtype=int)
+    pos[perm] = np.arange(n)
+
+    partner = np.arange(n)
+    if Delta > 0:
+        E0, E1, _, _ = pattern(n)
+        y = recovery_lp(p_bar, p_hat, Gamma, Delta, perm)['y']
+        swaps = 0
+        for e in np.argsort(-y, kind="stable"):
+            if swaps == Delta or y[e] <= 1e-6:
+                break
+            if partner[E0[e]] == E0[e] and partner[E1[e]] == E1[e]:
+                partner[E0[e]], partner[E1[e]] = E1[e], E0[e]
+                swaps += 1
+    recovered = np.empty(n, dtype=int)
+    recovered[pos[partner]] = np.arange(n)
+    objval = float(adv_perm(p_bar, p_hat, Gamma, recovered))
+    if objval > adv_perm(p_bar, p_hat, Gamma, perm):
+        partner, recovered, objval = np.arange(n), perm, float(adv_perm(p_bar, p_hat, Gamma, perm))
+
+    return(partner, recovered, objval)
+
+#complete MIP start for model1 from the schedule perm, perm[j] is the job in
+#position j. the recovery of integral_recovery is used in scenario 0 with
+#mu[0] = 1, the other scenarios keep the identity. w, h follow from z, x, mu
+#and pi, rho are the adversary duals of the recovered schedule. returns the
+#variables, their start values and the objective value of the start
+def model1_start_values(var, p_bar, p_hat, Gamma, Delta, K, perm):
 
-    #solving min_max model to get warmstart solution
-    model = Model("min_max")
-    model.setParam("OutputFlag", 0)
-    model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
+    n = len(p_bar)
+    perm = np.asarray(perm)
+    partner, recovered, objval = integral_recovery(p_bar, p_hat, Gamma, Delta, perm)
 
-    #variables
-    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
-    rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
+    X = np.zeros((n, n))
+    X[perm, np.arange(n)] = 1
+    Z = np.zeros((n, n, K))
+    Z[np.arange(n), np.arange(n), 1:] = 1
+    Z[np.arange(n), partner, 0] = 1
+    mu = np.zeros(K)
+    mu[0] = 1
+    W = np.einsum('ilk,lj->ijlk', Z, X)
+    H = W*mu
+    pi, rho = adv_dual(p_bar, p_hat, Gamma, recovered)
 
-    #objective
-    model.setObjective(quicksum(p_bar[i]*(n+1-j)*x[i,j] for i in N for j in N) + Gamma*pi + quicksum(rho[i] for i in N))
-    
-    #constraints
-    model.addConstrs(pi + rho[i] >= quicksum(p_hat[i]*(n+1-j)*x[i,j] for j in N) for i in N)
-    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
-    
-    model.optimize()
-    
-    ws_x = [[model.getVarByName("x[{},{}]".format(i,j)).X for j in N] for i in N]
-    ws_pi = model.getVarByName("pi").X
-    ws_rho = [model.getVarByName("rho[{}]".format(i)).X for i in N]
+    variables, values = start_lists(var, {'x':X, 'z':Z, 'w':W, 'h':H, 'mu':mu, 'rho':np.asarray(rho)}, pi)
+    return(variables, values, objval)
+
+def model1_start(model, var, p_bar, p_hat, Gamma, Delta, K, perm):
+
+    variables, values, objval = model1_start_values(var, p_bar, p_hat, Gamma, Delta, K, perm)
+    model.setAttr("Start", variables, values)
+
+    return(objval)
+
+def model1_ws(p_bar, p_hat, Gamma, Delta, K, time_limit, start=None, threads=4, env=None):
+
+    #min_max schedule as warmstart, unless a schedule is given (start[j] is
+    #the job in position j)
+    if start is None:
+        start = min_max_start(p_bar, p_hat, Gamma)['perm']
 
     #solving model1 with warmstart
-    model = Model("model1_ws")
+    model, var = build_model1(p_bar, p_hat, Gamma, Delta, K, time_limit, threads, name="model1_ws", env=env)
 #    model.setParam("OutputFlag", 0)
+    start_objval = model1_start(model, var, p_bar, p_hat, Gamma, Delta, K, start)
+
+    sol = optimize_from_start(model, start_objval)
+#    model.write("model1.sol")
+    return(sol)
+
+#model1 with a reduced core. the O(n^3 K) McCormick families are replaced by
+#the aggregated equalities
+#   sum_j w[i,j,l,k] = z[i,l,k],  sum_i w[i,j,l,k] = x[l,j],  sum_{j,l} h[i,j,l,k] = mu[k]
+#which hold for every solution of model1 and already force w = x*z for
+#integral x, z (so w is continuous). the only family that is still needed,
+#h[i,j,l,k] <= w[i,j,l,k], is separated as lazy constraints at integral
+#solutions. violated h <= w, w >= x + z - 1 and h >= mu - (1-w) of the root
+#LP relaxation are added as user cuts
+def build_model1_lazy(p_bar, p_hat, Gamma, Delta, K, time_limit, threads=4, name="model1_lazy", env=None):
+
+    start = time.time()
+    n = len(p_bar)
+    N = [i for i in range(n)]
+    K = [k for k in range(K)]
+
+    model = Model(name, env=env)
     model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
-    
+    model.setParam("Threads", threads)
+    model.setParam("LazyConstraints", 1)
+    model.setParam("PreCrush", 1)
+
     #variables
     x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    z = model.addVars([(i,j,k) for i in N for j in N for k in K], vtype=GRB.BINARY, name="z")
-    w = model.addVars([(i,j,l,k) for i in N for j in N for l in N for k in K], vtype=GRB.BINARY, name="w")
+    z = model.addVars([(i,j,k) for i in N for j in N for k in K if i <= j], vtype=GRB.BINARY, name="z")
+    w = model.addVars([(i,j,l,k) for i in N for j in N for l in N for k in K], vtype=GRB.CONTINUOUS, lb=0, name="w")
     h = model.addVars([(i,j,l,k) for i in N for j in N for l in N for k in K], vtype=GRB.CONTINUOUS, lb=0, name="h")
     mu = model.addVars([k for k in K], vtype=GRB.CONTINUOUS, name="mu", lb=0)
     pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
     rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
 
-    #setting warmstart
-    pi.start = ws_pi
-    for i in N:
-        rho[i].start = ws_rho[i]
-        for j in N:
-            x[i,j].start = ws_x[i][j]
+    #recoveries are symmetric, so z is only indexed by i <= j and zs[i,j,k]
+    #is z[i,j,k] for either order of i and j
+    zs = {(i,j,k):z[min(i,j),max(i,j),k] for i in N for j in N for k in K}
 
     #objective
     model.setObjective(quicksum(quicksum(p_bar[i]*(n-j+1)*quicksum(h[i,j,l,k] for l in N) for i in N for j in N) for k in K) + Gamma*pi + quicksum(rho[i] for i in N), GRB.MINIMIZE)
@@ -104,22 +159,82 @@ def model1_ws(p_bar, p_hat, Gamma, Delta, K, time_limit):
     #constraints
     model.addConstr(quicksum(mu[k] for k in K) == 1)
     model.addConstrs(pi + rho[i] >= quicksum(quicksum(p_hat[i]*(n-j+1)*quicksum(h[i,j,l,k] for l in N) for j in N) for k in K) for i in N)
-    model.addConstrs(quicksum(z[i,j,k] for i in N) == 1 for j in N for k in K)
-    model.addConstrs(quicksum(z[i,j,k] for j in N) == 1 for i in N for k in K)
-    model.addConstrs(z[i,j,k] == z[j,i,k] for i in N for j in N for k in K)
-    model.addConstrs(quicksum(z[i,i,k] for i in N) >= n - 2*Delta for k in K)
-    model.addConstrs(w[i,j,l,k] <= z[i,l,k] for i in N for j in N for l in N for k in K)
-    model.addConstrs(w[i,j,l,k] <= x[l,j] for i in N for j in N for l in N for k in K)
-    model.addConstrs(w[i,j,l,k] >= x[l,j] + z[i,l,k] - 1 for i in N for j in N for l in N for k in K)
-    model.addConstrs(h[i,j,l,k] <= w[i,j,l,k] for i in N for j in N for l in N for k in K)
-    model.addConstrs(h[i,j,l,k] <= mu[k] for i in N for j in N for l in N for k in K)
-    model.addConstrs(h[i,j,l,k] >= mu[k] - (1-w[i,j,l,k]) for i in N for j in N for l in N for k in K)
+    model.addConstrs(quicksum(zs[i,j,k] for j in N) == 1 for i in N for k in K)
+    recovery = model.addConstrs(quicksum(z[i,i,k] for i in N) >= n - 2*Delta for k in K)
+    model.addConstrs(quicksum(w[i,j,l,k] for j in N) == zs[i,l,k] for i in N for l in N for k in K)
+    model.addConstrs(quicksum(w[i,j,l,k] for i in N) == x[l,j] for j in N for l in N for k in K)
+    model.addConstrs(quicksum(h[i,j,l,k] for j in N for l in N) == mu[k] for i in N for k in K)
     model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
     model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
 
-    model.optimize()
+    var = {'x':x, 'z':z, 'zs':zs, 'w':w, 'h':h, 'mu':mu, 'pi':pi, 'rho':rho, 'recovery':recovery}
+    model._build_time = time.time() - start
+    return(model, var)
+
+#separation callback of model1_lazy. model._sep holds the variables as flat
+#lists in the order of their keys, the shape (n, n, n, K) and the counters
+def separate(model, where):
+
+    if where == GRB.Callback.MIPSOL:
+        get = model.cbGetSolution
+    elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL and model.cbGet(GRB.Callback.MIPNODE_NODCNT) == 0:
+        #user cuts at the root node only
+        get = model.cbGetNodeRel
+    else:
+        return
+
+    start = time.time()
+    sep = model._sep
+    n, K = sep['n'], sep['K']
+    w = np.asarray(get(sep['w'])).reshape(n, n, n, K)
+    h = np.asarray(get(sep['h'])).reshape(n, n, n, K)
+
+    if where == GRB.Callback.MIPSOL:
+        #h[i,j,l,k] <= w[i,j,l,k]
+        for idx in zip(*np.nonzero(h - w > 1e-6)):
+            model.cbLazy(sep['h_td'][idx] <= sep['w_td'][idx])
+            sep['lazy'] += 1
+    else:
+        x = np.asarray(get(sep['x'])).reshape(n, n)
+        z = np.zeros((n, n, K))
+        z[sep['z_keys']] = get(sep['z'])
+        z = np.maximum(z, z.transpose(1, 0, 2))
+        mu = np.asarray(get(sep['mu']))
+        #violations of h <= w, w >= x[l,j] + z[i,l,k] - 1 and h >= mu[k] - (1-w),
+        #the most violated max_cuts of them are added
+        lhs = x.T[None,:,:,None] + z[:,None,:,:] - 1
+        violation = np.stack([h - w, lhs - w, mu[None,None,None,:] - 1 + w - h])
+        idx = np.argsort(violation, axis=None)[::-1][:sep['max_cuts']]
+        for f, i, j, l, k in zip(*np.unravel_index(idx, violation.shape)):
+            if violation[f,i,j,l,k] <= 1e-4:
+                break
+            w_, h_ = sep['w_td'][i,j,l,k], sep['h_td'][i,j,l,k]
+            if f == 0:
+                model.cbCut(h_ <= w_)
+            elif f == 1:
+                model.cbCut(w_ >= sep['x_td'][l,j] + sep['zs_td'][i,l,k] - 1)
+            else:
+                model.cbCut(h_ >= sep['mu_td'][k] - (1 - w_))
+            sep['cuts'] += 1
+
+    sep['time'] += time.time() - start
+
+def model1_lazy(p_bar, p_hat, Gamma, Delta, K, time_limit, threads=4, max_cuts=100, env=None):
 
-    sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':model.ObjVal, 'mipgap':model.MIPGap, 'runtime':model.Runtime}
-#    model.write("model1.sol")
-    return(sol)
+    n = len(p_bar)
+    model, var = build_model1_lazy(p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env=env)
+    model.setParam("OutputFlag", 0)
 
+    model._sep = {'n':n, 'K':K, 'max_cuts':max_cuts, 'lazy':0, 'cuts':0, 'time':0.0}
+    for name in ['x', 'z', 'w', 'h', 'mu']:
+        model._sep[name] = list(var[name].values())
+        model._sep[name + '_td'] = var[name]
+    model._sep['zs_td'] = var['zs']
+    model._sep['z_keys'] = tuple(np.array(list(var['z'].keys())).T)
+    optimize(model, separate)
+
+    sol = get_sol(model)
+    sol['lazy_constraints'] = model._sep['lazy']
+    sol['user_cuts'] = model._sep['cuts']
+    sol['separation_time'] = model._sep['time']
+    return(sol)
@@ -0,0 +1,79 @@
+
+from gurobipy import *
+from assignment import build_model2
+from general import build_model1
+from matching import build_model3
+from minmax import build_min_max
+from solution import get_sol, optimize
+
+#persistent model for sweeping Gamma and Delta on one instance. across a sweep
+#only the objective coefficient of pi (Gamma) and the right-hand side of the
+#recovery constraints (Delta) change, so the model is built once and modified
+#in place. before each re-solve the previous solution is passed as a MIP
+#start: the full solution after a change of Gamma, which leaves it feasible,
+#and only the first-stage x after a change of Delta, which Gurobi completes.
+#continuous re-solves and the LP relaxation restart from the previous basis
+
+FORMULATIONS = ['min_max', 'model1', 'model2', 'model3']
+
+class IncrementalModel:
+
+    def __init__(self, formulation, p_bar, p_hat, Gamma, Delta=0, K=2, time_limit=600, threads=4, env=None):
+
+        self.formulation = formulation
+        self.n = len(p_bar)
+        if formulation == 'min_max':
+            self.model, self.var = build_min_max(p_bar, p_hat, Gamma, time_limit, threads, env=env)
+        elif formulation == 'model1':
+            self.model, self.var = build_model1(p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env=env)
+        elif formulation == 'model2':
+            self.model, self.var = build_model2(p_bar, p_hat, Gamma, Delta, time_limit, threads, env=env)
+        elif formulation == 'model3':
+            self.model, self.var = build_model3(p_bar, p_hat, Gamma, Delta, time_limit, threads, env=env)
+        else:
+            raise ValueError("unknown formulation {}".format(formulation))
+        self.model.setParam("OutputFlag", 0)
+        self.Gamma = Gamma
+        self.Delta = Delta
+        self.delta_changed = False
+
+    def set_gamma(self, Gamma):
+
+        self.var['pi'].Obj = Gamma
+        self.Gamma = Gamma
+
+    def set_delta(self, Delta):
+
+        if self.formulation == 'min_max':
+            raise ValueError("min_max has no recovery budget")
+        if Delta == self.Delta:
+            return
+        #model1 and model2 bound the fixed points, sum(z[i,i,k]) and
+        #sum(y[i,i]) >= n - 2*Delta, model3 the swaps, sum(y[e]) <= Delta
+        rhs = Delta if self.formulation == 'model3' else self.n - 2*Delta
+        recovery = self.var['recovery']
+        for constr in (recovery.values() if isinstance(recovery, dict) else [recovery]):
+            constr.RHS = rhs
+        self.Delta = Delta
+        self.delta_changed = True
+
+    def set_time_limit(self, time_limit):
+
+        self.model.setParam("TimeLimit", time_limit)
+
+    def optimize(self):
+
+        model = self.model
+        if model.SolCount > 0:
+            if self.delta_changed:
+                model.setAttr("Start", model.getVars(), [GRB.UNDEFINED]*model.NumVars)
+                x = list(self.var['x'].values())
+                model.setAttr("Start", x, model.getAttr("X", x))
+            else:
+                model.setAttr("Start", model.getVars(), model.getAttr("X", model.getVars()))
+        self.delta_changed = False
+
+        optimize(model)
+
+        sol = get_sol(model)
+        return(sol)
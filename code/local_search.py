@@ -0,0 +1,114 @@
+
+import time
+import numpy as np
+from adversary import adv_perm
+from maxmin import max_min_schedule
+from minmax import min_max_lsa
+from recovery import BATCH, recoverable_cost
+from sorting import sorting_schedule
+
+#iterated local search over permutations. every schedule is scored with the
+#exact recoverable cost, starting from the sorting, max-min and min-max
+#schedules. a descent step scans the swap and insert neighbourhoods of the
+#current schedule in order of their (cheap) no-recourse cost adv_perm and
+#moves to the first neighbour with a lower recoverable cost. local optima
+#are perturbed by random swaps of the best schedule found so far
+
+#start schedules, perm[j] is the job in position j
+def start_schedules(p_bar, p_hat, Gamma, time_limit):
+
+    starts = [sorting_schedule(p_bar, p_hat, 0), sorting_schedule(p_bar, p_hat, 1), min_max_lsa(p_bar, p_hat, Gamma)['perm']]
+    x = np.asarray(max_min_schedule(p_bar, p_hat, Gamma, time_limit))
+    starts.append(np.argmax(x, axis=0).tolist())
+
+    return(starts)
+
+#all schedules one swap or one insert move away from perm
+def neighbours(perm):
+
+    n = len(perm)
+    perm = np.asarray(perm)
+
+    A, B = np.triu_indices(n, 1)
+    swaps = np.tile(perm, (len(A), 1))
+    swaps[np.arange(len(A)), A] = perm[B]
+    swaps[np.arange(len(A)), B] = perm[A]
+
+    #move the job in position i to position j, skipping moves that are swaps
+    inserts = [np.insert(np.delete(perm, i), j, perm[i]) for i in range(n) for j in range(n) if abs(i - j) > 1]
+    inserts = np.array(inserts).reshape(-1, n)
+
+    return(np.concatenate([swaps, inserts]))
+
+#anytime search. yields (elapsed time, best objective, best schedule) every
+#time the best schedule improves, until time_limit seconds have passed
+def local_search_iter(p_bar, p_hat, Gamma, Delta, time_limit, starts=None, seed=0):
+
+    begin = time.time()
+    rng = np.random.default_rng(seed)
+    n = len(p_bar)
+
+    def remaining():
+        return(time_limit - (time.time() - begin))
+
+    if starts is None:
+        starts = start_schedules(p_bar, p_hat, Gamma, time_limit)
+    values = recoverable_cost(p_bar, p_hat, Gamma, Delta, np.array(starts))
+    best_val = min(values)
+    best = np.asarray(starts[int(np.argmin(values))])
+    yield(time.time() - begin, float(best_val), best.tolist())
+
+    current, current_val = best.copy(), best_val
+    while remaining() > 0:
+
+        #descent to a local optimum
+        improved = True
+        while improved and remaining() > 0:
+            improved = False
+            nb = neighbours(current)
+            if Delta == 0:
+                #without recourse the whole neighbourhood is scored in one call
+                nb_vals = adv_perm(p_bar, p_hat, Gamma, nb)
+                idx = int(np.argmin(nb_vals))
+                if nb_vals[idx] < current_val - 1e-9:
+                    current, current_val = nb[idx], nb_vals[idx]
+                    improved = True
+                continue
+            #the neighbours are scored BATCH at a time in one LP, the first
+            #improving one of a batch is taken
+            order = np.argsort(adv_perm(p_bar, p_hat, Gamma, nb), kind="stable")
+            for start in range(0, len(order), BATCH):
+                if remaining() <= 0:
+                    break
+                batch = order[start:start + BATCH]
+                vals = recoverable_cost(p_bar, p_hat, Gamma, Delta, nb[batch])
+                better = np.nonzero(vals < current_val - 1e-9)[0]
+                if len(better) > 0:
+                    current, current_val = nb[batch[better[0]]], vals[better[0]]
+                    improved = True
+                    break
+
+        if current_val < best_val - 1e-9:
+            best, best_val = current.copy(), current_val
+            yield(time.time() - begin, float(best_val), best.tolist())
+
+        #perturbation of the best schedule
+        current = best.copy()
+        for _ in range(max(2, n//5)):
+            a, b = rng.choice(n, 2, replace=False)
+            current[[a, b]] = current[[b, a]]
+        current_val = recoverable_cost(p_bar, p_hat, Gamma, Delta, current)
+
+#runs local_search_iter to the time limit. callback, if given, is called with
+#each improvement (elapsed time, best objective, best schedule)
+def local_search(p_bar, p_hat, Gamma, Delta, time_limit, starts=None, seed=0, callback=None):
+
+    start = time.time()
+    history = []
+    for elapsed, objval, perm in local_search_iter(p_bar, p_hat, Gamma, Delta, time_limit, starts, seed):
+        history.append((elapsed, objval))
+        if callback is not None:
+            callback(elapsed, objval, perm)
+
+    sol = {'objval':objval, 'perm':perm, 'runtime':time.time() - start, 'history':history}
+    return(sol)
@@ -1,118 +1,156 @@
 
 from gurobipy import *
+from backend import GurobiModel
+import formulations
+from minmax import min_max_start
+from preprocessing import dominance
+from recovery import pattern, recovery_lp
+from solution import get_sol, optimize, optimize_from_start, start_lists
+import numpy as np
+import scipy.sparse as sp
+import time
 
-def model3(p_bar, p_hat, Gamma, Delta, time_limit):
-    
-    n = len(p_bar)
-    N = [i for i in range(n)]
+#builds model3 of formulations.model3 without solving it. returns the model
+#and its variables, plus the constraints whose right-hand side depends on
+#Delta under 'recovery'. with the result pre of preprocessing.dominance,
+#x[i,l] outside the position windows and the products u[i,j,l] =
+#y[i,j]*x[i,l], v[i,j,l] = y[i,j]*x[j,l] with them are not built and the jobs
+#are ordered by the precedences; var['eliminated'] counts the variables left
+#out
+def build_model3(p_bar, p_hat, Gamma, Delta, time_limit, threads=4, name="model3", pre=None, env=None):
 
-    model = Model("model3")
-#    model.setParam("OutputFlag", 0)
+    start = time.time()
+    model = Model(name, env=env)
     model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
-    
-    E = [(i,j) for i in N for j in N if j>i]
-    
-    #variables
-    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    y = model.addVars([e for e in E], vtype=GRB.CONTINUOUS, name="y", lb=0)
-    pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
-    rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
-    u = model.addVars([(i,j,l) for i in N for j in N for l in N], vtype=GRB.CONTINUOUS, name="u", lb=0)
-    v = model.addVars([(i,j,l) for i in N for j in N for l in N], vtype=GRB.CONTINUOUS, name="v", lb=0)
+    model.setParam("Threads", threads)
 
-    #objective
-    model.setObjective(quicksum(p_bar[i]*(n+1-quicksum(x[i,l]*l for l in N)) for i in N) + quicksum(p_bar[e[1]]*quicksum(v[e[0],e[1],l]*l for l in N) - p_bar[e[1]]*quicksum(u[e[0],e[1],l]*l for l in N) - p_bar[e[0]]*quicksum(v[e[0],e[1],l]*l for l in N) + p_bar[e[0]]*quicksum(u[e[0],e[1],l]*l for l in N) for e in E) + Gamma*pi + quicksum(rho[i] for i in N), GRB.MINIMIZE)
-    
-    #constraints
-    model.addConstrs(rho[i] + pi + quicksum(p_hat[e[0]]*(quicksum(v[e[0],e[1],l]*l for l in N)-quicksum(u[e[0],e[1],l]*l for l in N)) for e in E if e[0] == i) - quicksum(p_hat[e[1]]*(quicksum(v[e[0],e[1],l]*l for l in N)-quicksum(u[e[0],e[1],l]*l for l in N)) for e in E if e[1] == i) >= p_hat[i]*(n+1-quicksum(x[i,l]*l for l in N)) for i in N)
-    model.addConstrs(quicksum(y[e] for e in E if (e[0] == i) or (e[1] == i)) <= 1 for i in N)
-    model.addConstr(quicksum(y[e] for e in E) <= Delta)
-    model.addConstrs(u[e[0],e[1],l] <= x[e[0],l] for e in E for l in N)
-    model.addConstrs(u[e[0],e[1],l] <= y[e[0],e[1]] for e in E for l in N)
-    model.addConstrs(u[e[0],e[1],l] >= y[e[0],e[1]] - (1-x[e[0],l]) for e in E for l in N)
-    model.addConstrs(v[e[0],e[1],l] <= x[e[1],l] for e in E for l in N)
-    model.addConstrs(v[e[0],e[1],l] <= y[e[0],e[1]] for e in E for l in N)
-    model.addConstrs(v[e[0],e[1],l] >= y[e[0],e[1]] - (1-x[e[1],l]) for e in E for l in N)
-    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
-    
-    model.optimize()
-
-    sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':model.ObjVal, 'mipgap':model.MIPGap, 'runtime':model.Runtime}
+    var = formulations.model3(GurobiModel(model), p_bar, p_hat, Gamma, Delta, pre)
+    model._build_time = time.time() - start
+    return(model, var)
+
+def model3(p_bar, p_hat, Gamma, Delta, time_limit, threads=4, preprocess=False, env=None):
+
+    #dominance preprocessing, see preprocessing.py
+    pre = dominance(p_bar, p_hat, Gamma, Delta) if preprocess else None
+    model, var = build_model3(p_bar, p_hat, Gamma, Delta, time_limit, threads, pre=pre, env=env)
+#    model.setParam("OutputFlag", 0)
+
+    optimize(model)
+
+    sol = get_sol(model)
+    sol['eliminated'] = var['eliminated']
     return(sol)
 
-def model3_ws(p_bar, p_hat, Gamma, Delta, time_limit):
-    
+#complete MIP start for model3 from the schedule perm, perm[j] is the job in
+#position j. the swaps y are the optimal recovery of recovery_lp, u[i,j,l]
+#and v[i,j,l] are y[i,j]*x[i,l] and y[i,j]*x[j,l]. returns the variables,
+#their start values and the objective value of the start
+def model3_start_values(var, p_bar, p_hat, Gamma, Delta, perm):
+
     n = len(p_bar)
-    N = [i for i in range(n)]
-    
-    #solving min_max model to get warmstart solution
-    model = Model("min_max")
-    model.setParam("OutputFlag", 0)
-    model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
+    E0, E1, _, _ = pattern(n)
+    rec = recovery_lp(p_bar, p_hat, Gamma, Delta, perm)
 
-    #variables
-    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
-    rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
+    X = np.zeros((n, n))
+    X[np.asarray(perm), np.arange(n)] = 1
+    Y = np.zeros((n, n))
+    Y[E0, E1] = np.clip(rec['y'], 0, 1)
+    U = Y[:,:,None]*X[:,None,:]
+    V = Y[:,:,None]*X[None,:,:]
 
-    #objective
-    model.setObjective(quicksum(p_bar[i]*(n+1-j)*x[i,j] for i in N for j in N) + Gamma*pi + quicksum(rho[i] for i in N))
-    
-    #constraints
-    model.addConstrs(pi + rho[i] >= quicksum(p_hat[i]*(n+1-j)*x[i,j] for j in N) for i in N)
-    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
-    
-    model.optimize()
-    
-    ws_x = [[model.getVarByName("x[{},{}]".format(i,j)).X for j in N] for i in N]
-    ws_pi = model.getVarByName("pi").X
-    ws_rho = [model.getVarByName("rho[{}]".format(i)).X for i in N]
+    variables, values = start_lists(var, {'x':X, 'y':Y, 'u':U, 'v':V, 'rho':rec['rho']}, rec['pi'])
+    return(variables, values, rec['objval'])
+
+def model3_start(model, var, p_bar, p_hat, Gamma, Delta, perm):
+
+    variables, values, objval = model3_start_values(var, p_bar, p_hat, Gamma, Delta, perm)
+    model.setAttr("Start", variables, values)
+
+    return(objval)
+
+def model3_ws(p_bar, p_hat, Gamma, Delta, time_limit, start=None, threads=4, env=None):
+
+    #min_max schedule as warmstart, unless a schedule is given (start[j] is
+    #the job in position j)
+    if start is None:
+        start = min_max_start(p_bar, p_hat, Gamma)['perm']
 
     #solving model3 with warmstart
-    model = Model("model3_ws")
+    model, var = build_model3(p_bar, p_hat, Gamma, Delta, time_limit, threads, name="model3_ws", env=env)
+#    model.setParam("OutputFlag", 0)
+    start_objval = model3_start(model, var, p_bar, p_hat, Gamma, Delta, start)
+
+    sol = optimize_from_start(model, start_objval)
+    return(sol)
+
+
+
+#model3 built in bulk through the matrix API. u and v are only ever referenced
+#for pairs e in E, so they are flat MVars over (e,l) at index e*n + l, and each
+#O(n^3) McCormick block is a single sparse coefficient matrix
+def model3_matrix(p_bar, p_hat, Gamma, Delta, time_limit, threads=4, env=None):
+
+    start = time.time()
+    n = len(p_bar)
+    p_bar = np.asarray(p_bar, dtype=float)
+    p_hat = np.asarray(p_hat, dtype=float)
+    L = np.arange(n)
+
+    model = Model("model3_matrix", env=env)
 #    model.setParam("OutputFlag", 0)
     model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
-    
-    E = [(i,j) for i in N for j in N if j>i]
-    
+    model.setParam("Threads", threads)
+
+    E0, E1 = np.triu_indices(n, 1)
+    m = len(E0)
+
     #variables
-    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    y = model.addVars([e for e in E], vtype=GRB.CONTINUOUS, name="y", lb=0)
-    pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
-    rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
-    u = model.addVars([(i,j,l) for i in N for j in N for l in N], vtype=GRB.CONTINUOUS, name="u", lb=0)
-    v = model.addVars([(i,j,l) for i in N for j in N for l in N], vtype=GRB.CONTINUOUS, name="v", lb=0)
-    
-    #setting warmstart
-    pi.start = ws_pi
-    for i in N:
-        rho[i].start = ws_rho[i]
-        for j in N:
-            x[i,j].start = ws_x[i][j]
+    x = model.addMVar(n*n, vtype=GRB.BINARY, name="x")
+    y = model.addMVar(m, vtype=GRB.CONTINUOUS, name="y", lb=0)
+    pi = model.addMVar(1, vtype=GRB.CONTINUOUS, name="pi", lb=0)
+    rho = model.addMVar(n, vtype=GRB.CONTINUOUS, name="rho", lb=0)
+    u = model.addMVar(m*n, vtype=GRB.CONTINUOUS, name="u", lb=0)
+    v = model.addMVar(m*n, vtype=GRB.CONTINUOUS, name="v", lb=0)
+
+    #index maps of u/v[e,l] onto y[e], x[e[0],l], x[e[1],l] and of the pairs onto jobs
+    U = np.arange(m*n)
+    Y = np.arange(n*n)
+    e_of, l_of = U//n, U % n
+    uv_to_y = sp.csr_matrix((np.ones(m*n), (U, e_of)), shape=(m*n, m))
+    u_to_x = sp.csr_matrix((np.ones(m*n), (U, E0[e_of]*n + l_of)), shape=(m*n, n*n))
+    v_to_x = sp.csr_matrix((np.ones(m*n), (U, E1[e_of]*n + l_of)), shape=(m*n, n*n))
+    incidence = sp.csr_matrix((np.ones(2*m), (np.concatenate([E0, E1]), np.tile(np.arange(m), 2))), shape=(n, m))
+    row_sum = sp.csr_matrix((np.ones(n*n), (Y//n, Y)), shape=(n, n*n))
+    col_sum = sp.csr_matrix((np.ones(n*n), (Y % n, Y)), shape=(n, n*n))
+    ones = sp.csr_matrix(np.ones((n, 1)))
+
+    #cost coefficients: x[i,l] contributes -l per unit of p[i], v[e,l] and u[e,l]
+    #contribute +l and -l per unit of (p[e[1]] - p[e[0]])
+    c_x = np.tile(L, n).astype(float)
+    c_uv = l_of.astype(float)
+    d_bar = (p_bar[E1] - p_bar[E0])[e_of]
+    dev_x = sp.csr_matrix((c_x*np.repeat(p_hat, n), (Y//n, Y)), shape=(n, n*n))
+    dev_v = sp.csr_matrix((np.concatenate([c_uv*p_hat[E0][e_of], -c_uv*p_hat[E1][e_of]]), (np.concatenate([E0[e_of], E1[e_of]]), np.tile(U, 2))), shape=(n, m*n))
 
     #objective
-    model.setObjective(quicksum(p_bar[i]*(n+1-quicksum(x[i,l]*l for l in N)) for i in N) + quicksum(p_bar[e[1]]*quicksum(v[e[0],e[1],l]*l for l in N) - p_bar[e[1]]*quicksum(u[e[0],e[1],l]*l for l in N) - p_bar[e[0]]*quicksum(v[e[0],e[1],l]*l for l in N) + p_bar[e[0]]*quicksum(u[e[0],e[1],l]*l for l in N) for e in E) + Gamma*pi + quicksum(rho[i] for i in N), GRB.MINIMIZE)
-    
+    model.setObjective((n+1)*p_bar.sum() - (c_x*np.repeat(p_bar, n)) @ x + (c_uv*d_bar) @ v - (c_uv*d_bar) @ u + Gamma*pi.sum() + rho.sum(), GRB.MINIMIZE)
+
     #constraints
-    model.addConstrs(rho[i] + pi + quicksum(p_hat[e[0]]*(quicksum(v[e[0],e[1],l]*l for l in N)-quicksum(u[e[0],e[1],l]*l for l in N)) for e in E if e[0] == i) - quicksum(p_hat[e[1]]*(quicksum(v[e[0],e[1],l]*l for l in N)-quicksum(u[e[0],e[1],l]*l for l in N)) for e in E if e[1] == i) >= p_hat[i]*(n+1-quicksum(x[i,l]*l for l in N)) for i in N)
-    model.addConstrs(quicksum(y[e] for e in E if (e[0] == i) or (e[1] == i)) <= 1 for i in N)
-    model.addConstr(quicksum(y[e] for e in E) <= Delta)
-    model.addConstrs(u[e[0],e[1],l] <= x[e[0],l] for e in E for l in N)
-    model.addConstrs(u[e[0],e[1],l] <= y[e[0],e[1]] for e in E for l in N)
-    model.addConstrs(u[e[0],e[1],l] >= y[e[0],e[1]] - (1-x[e[0],l]) for e in E for l in N)
-    model.addConstrs(v[e[0],e[1],l] <= x[e[1],l] for e in E for l in N)
-    model.addConstrs(v[e[0],e[1],l] <= y[e[0],e[1]] for e in E for l in N)
-    model.addConstrs(v[e[0],e[1],l] >= y[e[0],e[1]] - (1-x[e[1],l]) for e in E for l in N)
-    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
-    
-    model.optimize()
-
-    sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':model.ObjVal, 'mipgap':model.MIPGap, 'runtime':model.Runtime}
-    return(sol)
+    model.addConstr(rho + ones @ pi + dev_v @ v - dev_v @ u + dev_x @ x >= (n+1)*p_hat)
+    model.addConstr(incidence @ y <= 1)
+    model.addConstr(y.sum() <= Delta)
+    model.addConstr(u - u_to_x @ x <= 0)
+    model.addConstr(u - uv_to_y @ y <= 0)
+    model.addConstr(u - uv_to_y @ y - u_to_x @ x >= -1)
+    model.addConstr(v - v_to_x @ x <= 0)
+    model.addConstr(v - uv_to_y @ y <= 0)
+    model.addConstr(v - uv_to_y @ y - v_to_x @ x >= -1)
+    model.addConstr(col_sum @ x == 1)
+    model.addConstr(row_sum @ x == 1)
+
+    model._build_time = time.time() - start
 
+    optimize(model)
+
+    sol = get_sol(model)
+    return(sol)
@@ -1,44 +1,59 @@
 
 from gurobipy import *
+from adversary import adv
+from backend import GurobiModel
+import formulations
 
 #max-min. best schedule for the worst-case scenario
-def max_min(p_bar, p_hat, Gamma, time_limit):
-    
+def max_min(p_bar, p_hat, Gamma, time_limit, threads=4, env=None):
+
+    x = max_min_schedule(p_bar, p_hat, Gamma, time_limit, threads, env)
+
+    #evaluate solution x with adv(x)
+    objval = adv(p_bar, p_hat, Gamma, x)
+
+    return(objval)
+
+#worst-case scenario, i.e. the scenario whose best schedule is most
+#expensive. returns the objective value, which is a lower bound for every
+#formulation, and the processing times p of the scenario
+def worst_case_scenario(p_bar, p_hat, Gamma, time_limit, threads=4, write_sol=False, env=None):
+
     n = len(p_bar)
     N = [i for i in range(n)]
 
-    #get worst-case scenario
-    model = Model("max_min")
+    model = Model("max_min", env=env)
     model.setParam("OutputFlag", 0)
     model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
-
-    #variables
-    alpha = model.addVars([j for j in N], vtype=GRB.CONTINUOUS, lb=-GRB.INFINITY, name="alpha")
-    beta = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, lb=-GRB.INFINITY, name="beta")
-    delta = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, lb=0, ub=1, name="delta")
-
-    #objective
-    model.setObjective(quicksum(alpha[j] for j in N) + quicksum(beta[i] for i in N), GRB.MAXIMIZE)
-
-    #constraints
-    model.addConstrs(alpha[j] + beta[i] <= (p_bar[i] + delta[i]*p_hat[i])*(n+1-j) for i in N for j in N)
-    model.addConstr(quicksum(delta[i] for i in N) <= Gamma)
+    model.setParam("Threads", threads)
+    var = formulations.max_min(GurobiModel(model), p_bar, p_hat, Gamma)
 
     model.optimize()
     
-    model.write('wcs.sol')
+    if write_sol:
+        model.write('wcs.sol')
 
     #worst-case scenario
     p = []
     for i in N:
-        p.append(p_bar[i] + model.getVarByName("delta[{}]".format(i)).X*p_hat[i])
+        p.append(p_bar[i] + var['delta'][i].X*p_hat[i])
+
+    return(model.ObjVal, p)
+
+#x[i][j] = 1 if job i is in position j
+def max_min_schedule(p_bar, p_hat, Gamma, time_limit, threads=4, env=None):
+    
+    n = len(p_bar)
+    N = [i for i in range(n)]
+
+    #get worst-case scenario
+    _, p = worst_case_scenario(p_bar, p_hat, Gamma, time_limit, threads, write_sol=False, env=env)
 
     #getting best solution for worst-case scenario
-    model = Model("scenario_soln")
+    model = Model("scenario_soln", env=env)
     model.setParam("OutputFlag", 0)
     model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
+    model.setParam("Threads", threads)
 
     #variables
     x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
@@ -57,29 +72,4 @@ def max_min(p_bar, p_hat, Gamma, time_limit):
         for j in N:
             x[i].append(model.getVarByName("x[{},{}]".format(i,j)).X)
 
-    #evaluate solution x with adv(x)
-    objval = adv(p_bar, p_hat, Gamma, x)
-
-    return(objval)
-
-def adv(p_bar, p_hat, Gamma, x):
-    
-    n = len(p_bar)
-    N = [i for i in range(n)]
-
-    model = Model("adv")
-    model.setParam("OutputFlag", 0)
-    
-    #variables
-    delta = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="delta", lb=0, ub=1)
-
-    #objective
-    model.setObjective(quicksum((p_bar[i] + delta[i]*p_hat[i])*(n+1-j)*x[i][j] for i in N for j in N), GRB.MAXIMIZE)
-    
-    #constraints
-    model.addConstr(quicksum(delta[i] for i in N) <= Gamma)
-
-    model.optimize()
-
-    return(model.objval)
-
+    return(x)
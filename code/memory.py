@@ -0,0 +1,36 @@
+
+import resource
+
+#peak resident set size of a solve. on linux the peak is VmHWM of
+#/proc/self/status, which reset_peak_rss() clears, so a process that runs
+#many solves (the workers of worker_pool.py) reports the peak of each job
+#rather than that of the largest model it has solved so far. elsewhere it is
+#ru_maxrss over the life of the process. a process that tried to reset the
+#peak and could not reports None from then on
+
+peak_rss_known = True
+
+#peak resident set size in MB since the last reset
+def peak_rss():
+
+    if not peak_rss_known:
+        return(None)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return(int(line.split()[1])/1024)
+    except OSError:
+        pass
+
+    #ru_maxrss is in kilobytes on linux
+    return(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024)
+
+def reset_peak_rss():
+
+    global peak_rss_known
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+    except OSError:
+        peak_rss_known = False
@@ -1,33 +1,96 @@
 
 from gurobipy import *
+from backend import GurobiModel
+import formulations
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+import time
+from solution import optimize_from_start
+from warmstart import WarmStartCache
+
+#builds the min-max model of formulations.min_max without solving it.
+#returns the model and its variables
+def build_min_max(p_bar, p_hat, Gamma, time_limit, threads=4, name="min_max", env=None):
+
+    start = time.time()
+    model = Model(name, env=env)
+    model.setParam("TimeLimit", time_limit)
+    model.setParam("Threads", threads)
+
+    var = formulations.min_max(GurobiModel(model), p_bar, p_hat, Gamma)
+    model._build_time = time.time() - start
+    return(model, var)
 
 #min-max model, i.e. no recourse action. UB
-def min_max(p_bar, p_hat, Gamma, time_limit):
+def min_max(p_bar, p_hat, Gamma, time_limit, threads=4, env=None):
 
     n = len(p_bar)
     N = [i for i in range(n)]
-    
-    model = Model("min_max")
+
+    model, var = build_min_max(p_bar, p_hat, Gamma, time_limit, threads, env=env)
     model.setParam("OutputFlag", 0)
-    model.setParam("TimeLimit", time_limit)
-    model.setParam("Threads", 4)
-
-    #variables
-    x = model.addVars([(i,j) for i in N for j in N], vtype=GRB.BINARY, name="x")
-    pi = model.addVar(vtype=GRB.CONTINUOUS, name = "pi", lb=0)
-    rho = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="rho", lb=0)
-
-    #objective
-    model.setObjective(quicksum(p_bar[i]*(n+1-j)*x[i,j] for i in N for j in N) + Gamma*pi + quicksum(rho[i] for i in N))
-    
-    #constraints
-    model.addConstrs(pi + rho[i] >= quicksum(p_hat[i]*(n+1-j)*x[i,j] for j in N) for i in N)
-    model.addConstrs(quicksum(x[i,j] for i in N) == 1 for j in N)
-    model.addConstrs(quicksum(x[i,j] for j in N) == 1 for i in N)
-    
-    model.optimize()
-
-    sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':model.ObjVal, 'mipgap':model.MIPGap, 'runtime':model.Runtime}
+
+    #setting warmstart
+    ws = min_max_start(p_bar, p_hat, Gamma)
+    var['pi'].start = ws['pi']
+    for i in N:
+        var['rho'][i].start = ws['rho'][i]
+        for j in N:
+            var['x'][i,j].start = ws['x'][i][j]
+
+    sol = optimize_from_start(model, ws['objval'])
 #    model.write('minmax.sol')
     return(sol)
 
+#combinatorial min-max. for a fixed pi the dual of the adversary separates by
+#job, so the problem is a linear assignment problem with costs
+#p_bar[i]*(n+1-j) + max(0, p_hat[i]*(n+1-j) - pi). for any schedule an optimal
+#pi is 0 or one of the breakpoints p_hat[i]*(n+1-j), so solving the assignment
+#problem for each of the O(n^2) breakpoints gives the exact min-max optimum
+def min_max_lsa(p_bar, p_hat, Gamma):
+
+    start = time.time()
+    n = len(p_bar)
+    weight = n + 1 - np.arange(n)
+    nominal = np.outer(np.asarray(p_bar, dtype=float), weight)
+    deviation = np.outer(np.asarray(p_hat, dtype=float), weight)
+
+    best = None
+    for pi in np.unique(np.append(deviation, 0)):
+        cost = nominal + np.maximum(deviation - pi, 0)
+        rows, cols = linear_sum_assignment(cost)
+        objval = cost[rows, cols].sum() + Gamma*pi
+        if best is None or objval < best[0]:
+            best = (objval, pi, cols)
+    objval, pi, cols = best
+
+    #cols[i] is the position of job i
+    perm = np.argsort(cols)
+    x = [[1 if cols[i] == j else 0 for j in range(n)] for i in range(n)]
+    rho = np.maximum(deviation[np.arange(n), cols] - pi, 0).tolist()
+
+    sol = {'status':GRB.OPTIMAL, 'objbound':objval, 'objval':objval, 'mipgap':0.0, 'runtime':time.time() - start, 'perm':perm.tolist(), 'x':x, 'pi':float(pi), 'rho':rho}
+    return(sol)
+
+#min_max_lsa for a batch of instances, one sol per (p_bar, p_hat) pair
+def min_max_lsa_batch(p_bars, p_hats, Gamma):
+
+    return([min_max_lsa(p_bar, p_hat, Gamma) for p_bar, p_hat in zip(p_bars, p_hats)])
+
+#shared cache of min-max warm starts, see min_max_start
+ws_cache = WarmStartCache()
+
+#min-max solution (objval, perm, x, pi, rho) used as warm start by min_max and
+#every *_ws model. it does not depend on Delta, so it is computed once per
+#(instance, Gamma) with min_max_lsa and then taken from the cache
+def min_max_start(p_bar, p_hat, Gamma, cache=None):
+
+    if cache is None:
+        cache = ws_cache
+    ws = cache.get(p_bar, p_hat, Gamma)
+    if ws is None:
+        sol = min_max_lsa(p_bar, p_hat, Gamma)
+        ws = {'objval':sol['objval'], 'perm':sol['perm'], 'x':sol['x'], 'pi':sol['pi'], 'rho':sol['rho']}
+        cache.put(p_bar, p_hat, Gamma, ws)
+
+    return(ws)
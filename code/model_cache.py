@@ -0,0 +1,200 @@
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from gurobipy import Constr, GurobiError, Var, read, tupledict
+from assignment import build_model2
+from general import build_model1
+from matching import build_model3
+from warmstart import instance_hash
+
+#content-addressed cache of built models. the first build of a
+#(formulation, instance, Gamma, Delta, K) model writes it as <key>.mps.gz
+#together with <key>.json, the map of the entries of var onto variable and
+#constraint indices, and later builds read the model back with gurobipy.read
+#instead of generating it in Python. the key is a hash of the formulation,
+#the instance content, Gamma, Delta, K (model1 only) and BUILDER_VERSION,
+#which has to be bumped whenever a builder or the var map changes. TimeLimit
+#and Threads are parameters, not part of the file, so one artifact serves
+#every time limit and thread count. the artifacts of a directory are kept
+#below max_bytes by deleting the least recently used ones. with cache_dir
+#None nothing is cached and build() is the plain builder
+
+BUILDER_VERSION = 3
+
+#builders of the cached formulations, with the arguments of pipeline.build
+BUILDERS = {'model1':lambda p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env: build_model1(p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env=env),
+            'model2':lambda p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env: build_model2(p_bar, p_hat, Gamma, Delta, time_limit, threads, env=env),
+            'model3':lambda p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env: build_model3(p_bar, p_hat, Gamma, Delta, time_limit, threads, env=env)}
+
+#var entries as json: variables and constraints by index, dicts of them as
+#lists of [key, index] with the kind of their elements, and anything else
+#(e.g. var['eliminated']) as is
+def encode(value):
+
+    if isinstance(value, Var):
+        return({'var':value.index})
+    if isinstance(value, Constr):
+        return({'constr':value.index})
+    if isinstance(value, dict):
+        kind = 'constr' if any(isinstance(v, Constr) for v in value.values()) else 'var'
+        return({'tupledict' if isinstance(value, tupledict) else 'dict':[[key, v.index] for key, v in value.items()], 'kind':kind})
+    return({'value':value})
+
+def decode(entry, variables, constrs):
+
+    if 'var' in entry:
+        return(variables[entry['var']])
+    if 'constr' in entry:
+        return(constrs[entry['constr']])
+    if 'value' in entry:
+        return(entry['value'])
+    kind = 'tupledict' if 'tupledict' in entry else 'dict'
+    elements = constrs if entry['kind'] == 'constr' else variables
+    items = {tuple(key) if isinstance(key, list) else key:elements[index] for key, index in entry[kind]}
+    return(tupledict(items) if kind == 'tupledict' else items)
+
+class ModelCache:
+
+    def __init__(self, cache_dir=None, max_bytes=10*2**30):
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    #K only enters model1, the other formulations share one artifact for all K
+    def key(self, formulation, p_bar, p_hat, Gamma, Delta, K):
+
+        K = int(K) if formulation == 'model1' else None
+        data = json.dumps([formulation, instance_hash(p_bar, p_hat), float(Gamma), int(Delta), K, BUILDER_VERSION])
+
+        return(hashlib.sha256(data.encode()).hexdigest())
+
+    def paths(self, key):
+
+        return(os.path.join(self.cache_dir, key + ".mps.gz"), os.path.join(self.cache_dir, key + ".json"))
+
+    #model and var of the formulation, read from the cache if it has them and
+    #built (and stored) otherwise. model._build_time is the time actually spent
+    def build(self, formulation, p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env=None):
+
+        if formulation not in BUILDERS:
+            raise ValueError("unknown formulation {}".format(formulation))
+        if self.cache_dir is None:
+            return(BUILDERS[formulation](p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env))
+
+        start = time.time()
+        key = self.key(formulation, p_bar, p_hat, Gamma, Delta, K)
+        mps, var_map = self.paths(key)
+        #the var map is written last, so an artifact is complete once it exists
+        if os.path.exists(var_map):
+            try:
+                with open(var_map) as f:
+                    entries = json.load(f)
+                model = read(mps, env=env) if env is not None else read(mps)
+            except (GurobiError, OSError, ValueError):
+                entries = None
+            if entries is not None:
+                os.utime(var_map)
+                model.ModelName = formulation
+                model.setParam("TimeLimit", time_limit)
+                model.setParam("Threads", threads)
+                variables, constrs = model.getVars(), model.getConstrs()
+                var = {name:decode(entry, variables, constrs) for name, entry in entries.items()}
+                model._build_time = time.time() - start
+                self.hits += 1
+                return(model, var)
+
+        self.misses += 1
+        model, var = BUILDERS[formulation](p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env)
+        self.put(key, model, var)
+        return(model, var)
+
+    def put(self, key, model, var):
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        mps, var_map = self.paths(key)
+        model.update()
+        #gurobipy picks the format by the file name, so the temporary mps
+        #keeps its extension
+        tmp = "{}.{}.tmp.mps.gz".format(key, os.getpid())
+        model.write(os.path.join(self.cache_dir, tmp))
+        os.replace(os.path.join(self.cache_dir, tmp), mps)
+        tmp = "{}.{}.tmp".format(var_map, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump({name:encode(value) for name, value in var.items()}, f)
+        os.replace(tmp, var_map)
+        self.evict()
+
+    #deletes the least recently used artifacts until the directory holds at
+    #most max_bytes
+    def evict(self):
+
+        artifacts = []
+        for var_map in glob.glob(os.path.join(self.cache_dir, "*.json")):
+            mps = var_map[:-len(".json")] + ".mps.gz"
+            try:
+                artifacts.append((os.path.getmtime(var_map), os.path.getsize(var_map) + os.path.getsize(mps), var_map, mps))
+            except OSError:
+                continue
+        total = sum(size for _, size, _, _ in artifacts)
+        for _, size, var_map, mps in sorted(artifacts):
+            if total <= self.max_bytes:
+                break
+            for path in (var_map, mps):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+#shared cache of built models, see pipeline.build
+artifacts = ModelCache()
+
+#builds one model into the cache, as a job of a worker_pool.SolverPool
+def prebuild_cell(cache_dir, max_bytes, formulation, p_bar, p_hat, Gamma, Delta, K, env=None):
+
+    artifacts.cache_dir, artifacts.max_bytes = cache_dir, max_bytes
+    model, var = artifacts.build(formulation, p_bar, p_hat, Gamma, Delta, K, 0, 1, env)
+
+    return(formulation, len(p_bar), Gamma, Delta, model._build_time)
+
+#builds the models of a whole sweep into cache_dir on workers processes
+def prebuild(cache_dir, formulations, instance_files, grid, K, workers, max_bytes=10*2**30):
+
+    from run_experiments import read_instances
+    from worker_pool import JobError, SolverPool
+
+    with SolverPool(workers) as pool:
+        submitted = {}
+        for formulation in formulations:
+            for instance_file in instance_files:
+                for p_bar, p_hat in read_instances(instance_file):
+                    for Gamma, Delta in grid:
+                        key = pool.submit(prebuild_cell, cache_dir, max_bytes, formulation, p_bar, p_hat, Gamma, Delta, K)
+                        submitted[key] = (formulation, len(p_bar), Gamma, Delta)
+        for key, result in pool.as_completed():
+            if isinstance(result, JobError):
+                print(*submitted[key], 'error', result)
+                continue
+            formulation, n, Gamma, Delta, build_time = result
+            print(formulation, n, Gamma, Delta, build_time)
+
+if __name__ == "__main__":
+
+    from run_experiments import GRID
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--formulations", nargs="+", default=list(BUILDERS), choices=list(BUILDERS))
+    parser.add_argument("--instances", nargs="+", default=sorted(glob.glob("../instances/*.txt")))
+    parser.add_argument("--K", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache-dir", default="../results/models")
+    parser.add_argument("--max-gb", type=float, default=10)
+    args = parser.parse_args()
+
+    prebuild(args.cache_dir, args.formulations, args.instances, GRID, args.K, args.workers, int(args.max_gb*2**30))
@@ -0,0 +1,155 @@
+
+import time
+from gurobipy import *
+from assignment import model2_start, model2_start_values
+from general import integral_recovery, model1_start, model1_start_values
+from matching import model3_start, model3_start_values
+from maxmin import worst_case_scenario
+from minmax import min_max_start
+import model_cache
+from recovery import recoverable_cost
+from solution import first_incumbent, optimize, peak_rss, start_accepted, statistics
+from sorting import sorting_schedule
+
+#bounds pipeline for the exact formulations. before a MIP is built, the cheap
+#methods give upper bounds (the min-max, sorting and max-min schedules, each
+#with its best recovery in the formulation) and lower bounds (the max-min LP
+#value, which bounds every formulation, and optionally the LP relaxation).
+#cells where the bounds meet within GAP are closed without a MIP. otherwise
+#the best schedule is the MIP start, the upper bound sets Cutoff and
+#BestBdStop, the lower bound BestObjStop, and sol records in 'closed_by'
+#which bound closed the gap: 'bounds' (no MIP), 'upper_bound' (the MIP bound
+#reached the heuristic upper bound), 'lower_bound' (an incumbent reached the
+#lower bound), 'mip' (closed by the MIP itself) or None (time limit)
+
+FORMULATIONS = ['model1', 'model2', 'model3']
+
+#relative gap at which a cell counts as closed, Gurobi's default MIPGap
+GAP = 1e-4
+
+def closed(lb, ub):
+
+    return(ub - lb <= GAP*abs(ub))
+
+#objective value of the schedule perm (perm[j] is the job in position j) with
+#its best recovery in the formulation. model1 only has integral recoveries
+def schedule_value(formulation, p_bar, p_hat, Gamma, Delta, perm):
+
+    if formulation == 'model1':
+        return(integral_recovery(p_bar, p_hat, Gamma, Delta, perm)[2])
+
+    return(float(recoverable_cost(p_bar, p_hat, Gamma, Delta, perm)))
+
+#upper and lower bound of the heuristics, with the schedule of the upper bound
+def bounds(formulation, p_bar, p_hat, Gamma, Delta, time_limit, threads=4, env=None):
+
+    start = time.time()
+    n = len(p_bar)
+    N = [i for i in range(n)]
+
+    #the max-min schedule is the SPT order of the worst-case scenario
+    lb, p = worst_case_scenario(p_bar, p_hat, Gamma, time_limit, threads, env=env)
+    schedules = {'min_max':min_max_start(p_bar, p_hat, Gamma)['perm'],
+                 'sorting_nominal':sorting_schedule(p_bar, p_hat, 0),
+                 'sorting_worst_case':sorting_schedule(p_bar, p_hat, 1),
+                 'max_min':sorted(N, key=lambda i:p[i])}
+    values = {name:schedule_value(formulation, p_bar, p_hat, Gamma, Delta, perm) for name, perm in schedules.items()}
+    ub_source = min(values, key=values.get)
+
+    bnd = {'lb':lb, 'lb_source':'max_min', 'ub':values[ub_source], 'ub_source':ub_source, 'perm':list(schedules[ub_source]), 'runtime':time.time() - start}
+    return(bnd)
+
+#model and var of the formulation, from the model cache if one is set up
+def build(formulation, p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env=None):
+
+    return(model_cache.artifacts.build(formulation, p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env))
+
+def set_start(formulation, model, var, p_bar, p_hat, Gamma, Delta, K, perm):
+
+    if formulation == 'model1':
+        return(model1_start(model, var, p_bar, p_hat, Gamma, Delta, K, perm))
+    if formulation == 'model2':
+        return(model2_start(model, var, p_bar, p_hat, Gamma, Delta, perm))
+    return(model3_start(model, var, p_bar, p_hat, Gamma, Delta, perm))
+
+def start_values(formulation, var, p_bar, p_hat, Gamma, Delta, K, perm):
+
+    if formulation == 'model1':
+        return(model1_start_values(var, p_bar, p_hat, Gamma, Delta, K, perm))
+    if formulation == 'model2':
+        return(model2_start_values(var, p_bar, p_hat, Gamma, Delta, perm))
+    return(model3_start_values(var, p_bar, p_hat, Gamma, Delta, perm))
+
+#sol of a cell closed by the bounds alone. no MIP is solved, so of the
+#statistics of solution.py only the peak memory is reported
+def bounds_sol(bnd, closed_by, runtime):
+
+    sol = {'status':GRB.OPTIMAL, 'objbound':bnd['lb'], 'objval':bnd['ub'], 'mipgap':max(0, bnd['ub'] - bnd['lb'])/abs(bnd['ub']), 'runtime':runtime,
+           'lb':bnd['lb'], 'lb_source':bnd['lb_source'], 'ub':bnd['ub'], 'ub_source':bnd['ub_source'], 'closed_by':closed_by, 'perm':bnd['perm'],
+           'peak_rss_mb':peak_rss()}
+    return(sol)
+
+#solves model1, model2 or model3 after the bounds pipeline. time_limit covers
+#the bounds and the MIP
+def solve_with_bounds(formulation, p_bar, p_hat, Gamma, Delta, time_limit, K=2, threads=4, relaxation=False, env=None):
+
+    start = time.time()
+    bnd = bounds(formulation, p_bar, p_hat, Gamma, Delta, time_limit, threads, env)
+
+    return(solve_from_bounds(formulation, bnd, p_bar, p_hat, Gamma, Delta, time_limit, K, threads, relaxation, start, env))
+
+#second half of solve_with_bounds for bounds bnd in the format of bounds(),
+#which may also come from elsewhere, e.g. from finished cells of a sweep.
+#time_limit counts from start. sol['perm'] is the best schedule found
+def solve_from_bounds(formulation, bnd, p_bar, p_hat, Gamma, Delta, time_limit, K=2, threads=4, relaxation=False, start=None, env=None):
+
+    if start is None:
+        start = time.time()
+    n = len(p_bar)
+    if closed(bnd['lb'], bnd['ub']):
+        return(bounds_sol(bnd, 'bounds', time.time() - start))
+
+    model, var = build(formulation, p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env)
+    model.setParam("OutputFlag", 0)
+
+    #lower bound of the LP relaxation
+    if relaxation:
+        relaxed = model.relax()
+        relaxed.setParam("TimeLimit", max(0, time_limit - (time.time() - start)))
+        relaxed.optimize()
+        if relaxed.Status == GRB.OPTIMAL and relaxed.ObjVal > bnd['lb']:
+            bnd['lb'], bnd['lb_source'] = relaxed.ObjVal, 'relaxation'
+        if closed(bnd['lb'], bnd['ub']):
+            return(bounds_sol(bnd, 'bounds', time.time() - start))
+
+    #initial incumbent and bound-based stopping criteria
+    start_objval = set_start(formulation, model, var, p_bar, p_hat, Gamma, Delta, K, bnd['perm'])
+    model.setParam("Cutoff", bnd['ub'] + 1e-6*max(1, abs(bnd['ub'])))
+    model.setParam("BestObjStop", bnd['lb'] + GAP*abs(bnd['ub']))
+    model.setParam("BestBdStop", bnd['ub'] - GAP*abs(bnd['ub']))
+    model.setParam("TimeLimit", max(0, time_limit - (time.time() - start)))
+
+    model._first_incumbent = None
+    optimize(model, first_incumbent)
+
+    if model.SolCount > 0 and model.ObjVal < bnd['ub']:
+        objval, perm = model.ObjVal, [max(range(n), key=lambda i:var['x'][i,j].X) for j in range(n)]
+    else:
+        objval, perm = bnd['ub'], bnd['perm']
+    objbound = max(model.ObjBound, bnd['lb'])
+    if model.Status == GRB.CUTOFF:
+        #nothing better than the upper bound exists
+        objbound, closed_by = objval, 'upper_bound'
+    elif model.Status == GRB.USER_OBJ_LIMIT:
+        closed_by = 'lower_bound' if objval <= model.Params.BestObjStop else 'upper_bound'
+    elif model.Status == GRB.OPTIMAL:
+        closed_by = 'mip'
+    else:
+        closed_by = None
+
+    sol = {'status':GRB.OPTIMAL if closed_by is not None else model.Status, 'objbound':objbound, 'objval':objval,
+           'mipgap':max(0, objval - objbound)/abs(objval), 'runtime':time.time() - start,
+           'lb':bnd['lb'], 'lb_source':bnd['lb_source'], 'ub':bnd['ub'], 'ub_source':bnd['ub_source'], 'closed_by':closed_by, 'perm':perm,
+           'mip_status':model.Status, 'start_objval':start_objval, 'start_accepted':start_accepted(model, start_objval)}
+    sol.update(statistics(model))
+    return(sol)
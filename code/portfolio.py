@@ -0,0 +1,226 @@
+
+import multiprocessing as mp
+import os
+import queue
+import time
+from gurobipy import *
+import numpy as np
+from minmax import min_max_start
+from pipeline import GAP, build, set_start, start_values
+from recovery import recoverable_cost
+from solution import optimize, statistics
+
+#racing portfolio for one (instance, Gamma, Delta). every method runs in its
+#own process and the processes share, through a few synchronized values, the
+#best objective value with its schedule and the best bound found so far. a
+#worker publishes its incumbents and bounds from a callback, injects a better
+#schedule found by another worker as a completed solution of its own
+#formulation, and terminates once the shared gap is closed.
+#
+#model2 and model3 have the same value for every schedule, so they share
+#everything. model1 only allows K integral recoveries and its optimal value
+#can be larger, so the general methods form a group of their own: a bound of
+#model2/model3 is also a lower bound for model1, but not the other way round.
+#the portfolio solves the recoverable robust problem of model2/model3 (the
+#'relaxed' group) whenever one of its methods takes part, and model1 only
+#otherwise. the schedules of model1 incumbents are evaluated exactly with
+#recoverable_cost and count as incumbents of the relaxed group too. once the
+#gap of this target group closes, every worker is cancelled; a general group
+#that closes first only stops its own workers
+
+METHODS = {'general':'model1', 'general_ws':'model1', 'assignment':'model2', 'assignment_ws':'model2', 'matching':'model3', 'matching_ws':'model3'}
+
+#default portfolio, in the order in which methods are dropped from the back
+#when there are fewer cores than methods
+ORDER = ['matching_ws', 'general_ws', 'assignment_ws', 'matching', 'general', 'assignment']
+
+def group(method):
+
+    return('general' if METHODS[method] == 'model1' else 'relaxed')
+
+#group whose gap decides the portfolio
+def target(groups):
+
+    return('relaxed' if 'relaxed' in groups else 'general')
+
+def shared_state(n, groups):
+
+    shared = {'lock':mp.Lock(), 'groups':groups, 'target':target(groups)}
+    for g in groups:
+        shared[g] = {'stop':mp.Event(),
+                     'objval':mp.Value('d', GRB.INFINITY, lock=False), 'objbound':mp.Value('d', -GRB.INFINITY, lock=False),
+                     'perm':mp.Array('i', n, lock=False), 'version':mp.Value('i', 0, lock=False), 'winner':mp.Value('i', -1, lock=False)}
+    return(shared)
+
+def lower_bound(shared, g):
+
+    objbound = shared[g]['objbound'].value
+    if g == 'general' and 'relaxed' in shared['groups']:
+        objbound = max(objbound, shared['relaxed']['objbound'].value)
+
+    return(objbound)
+
+def gap_closed(shared, g):
+
+    objval = shared[g]['objval'].value
+    return(objval < GRB.INFINITY and objval - lower_bound(shared, g) <= GAP*abs(objval))
+
+#publishes an incumbent and/or a bound of worker w of group g. a group whose
+#gap closes records the worker as the winner and tells its workers to stop,
+#the target group all workers
+def publish(shared, g, w, objval=None, perm=None, objbound=None):
+
+    state = shared[g]
+    with shared['lock']:
+        if objval is not None and objval < state['objval'].value:
+            state['objval'].value = objval
+            state['perm'][:] = [int(i) for i in perm]
+            state['version'].value += 1
+        if objbound is not None and objbound > state['objbound'].value:
+            state['objbound'].value = objbound
+        for h in shared['groups']:
+            if gap_closed(shared, h) and shared[h]['winner'].value < 0:
+                shared[h]['winner'].value = w
+                shared[h]['stop'].set()
+                if h == shared['target']:
+                    for other in shared['groups']:
+                        shared[other]['stop'].set()
+
+#publishes the schedule perm of a model1 incumbent as an incumbent of the
+#relaxed group, with its exact recoverable cost
+def publish_relaxed(model, w, perm):
+
+    if model._group == 'general' and 'relaxed' in model._shared['groups']:
+        p_bar, p_hat, Gamma, Delta, _ = model._instance
+        publish(model._shared, 'relaxed', w, float(recoverable_cost(p_bar, p_hat, Gamma, Delta, perm)), perm)
+
+def share(model, where):
+
+    shared, g, state = model._shared, model._group, model._shared[model._group]
+    if where == GRB.Callback.MIPSOL:
+        x = np.asarray(model.cbGetSolution(model._x)).reshape(model._n, model._n)
+        publish(shared, g, model._w, model.cbGet(GRB.Callback.MIPSOL_OBJ), np.argmax(x, axis=0), model.cbGet(GRB.Callback.MIPSOL_OBJBND))
+        publish_relaxed(model, model._w, np.argmax(x, axis=0))
+    elif where == GRB.Callback.MIPNODE:
+        publish(shared, g, model._w, objbound=model.cbGet(GRB.Callback.MIPNODE_OBJBND))
+        #schedule of another worker that beats the own incumbent
+        if state['version'].value != model._version and state['objval'].value < model.cbGet(GRB.Callback.MIPNODE_OBJBST) - 1e-6:
+            with shared['lock']:
+                model._version = state['version'].value
+                perm = list(state['perm'])
+            variables, values, _ = start_values(model._formulation, model._var, *model._instance, perm)
+            model.cbSetSolution(variables, values)
+            model.cbUseSolution()
+    elif where == GRB.Callback.MIP:
+        publish(shared, g, model._w, objbound=model.cbGet(GRB.Callback.MIP_OBJBND))
+    if where in (GRB.Callback.MIP, GRB.Callback.MIPSOL, GRB.Callback.MIPNODE) and state['stop'].is_set():
+        model.terminate()
+
+def worker(w, method, p_bar, p_hat, Gamma, Delta, K, time_limit, threads, shared, results):
+
+    n = len(p_bar)
+    formulation = METHODS[method]
+    try:
+        model, var = build(formulation, p_bar, p_hat, Gamma, Delta, K, time_limit, threads)
+        model.setParam("OutputFlag", 0)
+        if method.endswith('_ws'):
+            set_start(formulation, model, var, p_bar, p_hat, Gamma, Delta, K, min_max_start(p_bar, p_hat, Gamma)['perm'])
+
+        model._shared, model._group, model._w, model._n, model._version = shared, group(method), w, n, 0
+        model._formulation, model._var, model._instance = formulation, var, (p_bar, p_hat, Gamma, Delta, K)
+        model._x = [var['x'][i,j] for i in range(n) for j in range(n)]
+        optimize(model, share)
+
+        if model.Status == GRB.OPTIMAL:
+            x = np.asarray(model.getAttr("X", model._x)).reshape(n, n)
+            publish(shared, group(method), w, model.ObjVal, np.argmax(x, axis=0), model.ObjVal)
+            publish_relaxed(model, w, np.argmax(x, axis=0))
+        sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':model.ObjVal if model.SolCount > 0 else GRB.INFINITY,
+               'runtime':model.Runtime}
+        sol.update(statistics(model))
+    except Exception as e:
+        sol = error_sol("{}: {}".format(type(e).__name__, e))
+    results.put((w, method, sol))
+
+#sol of a worker that failed or died, e.g. on a size-limited licence or when
+#its build ran out of memory
+def error_sol(error):
+
+    return({'status':None, 'objbound':-GRB.INFINITY, 'objval':GRB.INFINITY, 'runtime':None, 'error':error})
+
+#sol of one group of the portfolio. the workers run side by side, so the
+#node and iteration counts and the peak memory of the group are the sums
+#over its workers and the build time that of the slowest build
+def group_sol(shared, g, methods, start, workers):
+
+    objval, objbound = shared[g]['objval'].value, lower_bound(shared, g)
+    winner = shared[g]['winner'].value
+    sol = {'status':GRB.OPTIMAL if gap_closed(shared, g) else GRB.TIME_LIMIT, 'objbound':objbound, 'objval':objval,
+           'mipgap':max(0, objval - objbound)/abs(objval) if objval < GRB.INFINITY else GRB.INFINITY, 'runtime':time.time() - start,
+           'winner':methods[winner] if winner >= 0 else None}
+    sols = [workers[method] for method in set(methods) if group(method) == g and 'error' not in workers[method]]
+    sol['build_time'] = max((w['build_time'] for w in sols), default=None)
+    for name in ['node_count', 'iter_count', 'peak_rss_mb']:
+        sol[name] = sum(w[name] for w in sols) if sols else None
+    return(sol)
+
+#sols of the workers by method. a worker that died without reporting, e.g.
+#killed for running out of memory, gets an error sol
+def collect(processes, methods, results):
+
+    workers, reported = {}, set()
+    while len(reported) < len(processes):
+        try:
+            w, method, sol = results.get(timeout=1)
+            workers[method] = sol
+            reported.add(w)
+        except queue.Empty:
+            dead = [w for w, process in enumerate(processes) if w not in reported and process.exitcode is not None]
+            if not dead:
+                continue
+            #a worker puts its sol before it exits, so the sol may still be
+            #on its way through the queue
+            try:
+                while True:
+                    w, method, sol = results.get(timeout=1)
+                    workers[method] = sol
+                    reported.add(w)
+            except queue.Empty:
+                pass
+            for w in dead:
+                if w not in reported:
+                    workers[methods[w]] = error_sol("worker exited with code {}".format(processes[w].exitcode))
+                    reported.add(w)
+    return(workers)
+
+#runs the methods as a portfolio on cores cores, split evenly between them.
+#with fewer cores than methods only the first cores methods run, one thread
+#each, so that the portfolio never oversubscribes its cores. sol is that of
+#the portfolio for the target group (best objective value and bound over its
+#workers, wall-clock runtime, the method that closed the gap under
+#'winner'), with the sol of every worker under 'workers' and, if general and
+#relaxed methods are mixed, the sol of both groups under 'groups'. a worker
+#that failed has its error under 'error' in its sol
+def portfolio(p_bar, p_hat, Gamma, Delta, time_limit, methods=ORDER, K=2, cores=None):
+
+    start = time.time()
+    if cores is None:
+        cores = os.cpu_count()
+    methods = methods[:max(1, cores)]
+    threads = max(1, cores // len(methods))
+    groups = sorted(set(group(method) for method in methods))
+
+    shared = shared_state(len(p_bar), groups)
+    results = mp.Queue()
+    processes = [mp.Process(target=worker, args=(w, method, p_bar, p_hat, Gamma, Delta, K, time_limit, threads, shared, results)) for w, method in enumerate(methods)]
+    for process in processes:
+        process.start()
+    workers = collect(processes, methods, results)
+    for process in processes:
+        process.join()
+
+    sols = {g:group_sol(shared, g, methods, start, workers) for g in groups}
+    sol = dict(sols[target(groups)], workers=workers)
+    if len(groups) > 1:
+        sol['groups'] = sols
+    return(sol)
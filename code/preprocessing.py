@@ -0,0 +1,55 @@
+
+#dominance preprocessing. job i dominates job k if p_bar[i] <= p_bar[k] and
+#p_hat[i] <= p_hat[k] (identical jobs are ordered by index). without recovery
+#(Delta = 0) some optimal schedule has every job before the jobs it
+#dominates: moving i in front of k does not increase the cost under any
+#scenario delta, or under delta with delta[i] and delta[k] exchanged, and
+#does not create new inversions. with recovery this exchange argument fails,
+#as the recovery may reorder i and k, so for Delta > 0 only identical jobs are
+#ordered, which is valid in every formulation by symmetry.
+#
+#the precedences give each job a window of positions: job i has at least
+#as many jobs in front of it as it has predecessors and at least as many
+#behind it as it has successors. x[i,j] outside the windows, and the
+#variables that are products with them, are not built
+
+def precedes(p_bar, p_hat, Delta, i, k):
+
+    if (p_bar[i], p_hat[i]) == (p_bar[k], p_hat[k]):
+        return(i < k)
+    if Delta == 0:
+        return(p_bar[i] <= p_bar[k] and p_hat[i] <= p_hat[k])
+
+    return(False)
+
+#precedences (i,k), i before k, position windows (lo, hi) of the jobs, the
+#pairs (i,j) that x can take and the number of x variables eliminated
+def dominance(p_bar, p_hat, Gamma, Delta):
+
+    n = len(p_bar)
+    N = [i for i in range(n)]
+
+    precedence = [(i,k) for i in N for k in N if i != k and precedes(p_bar, p_hat, Delta, i, k)]
+    windows = {i:(sum(1 for a, b in precedence if b == i), n - 1 - sum(1 for a, b in precedence if a == i)) for i in N}
+    allowed = set((i,j) for i in N for j in N if windows[i][0] <= j <= windows[i][1])
+
+    pre = {'precedence':precedence, 'windows':windows, 'allowed':allowed, 'eliminated':n*n - len(allowed)}
+    return(pre)
+
+#pairs (i,j) that x can take, all of them without preprocessing
+def allowed(n, pre=None):
+
+    if pre is None:
+        return(set((i,j) for i in range(n) for j in range(n)))
+
+    return(pre['allowed'])
+
+#ordering constraints, position of i < position of k, for the precedences.
+#m is a model of backend.py (LinearModel or GurobiModel)
+def add_precedence(m, x, pre):
+
+    if pre is None:
+        return
+
+    pos = lambda i:m.sum(j*v for (a, j), v in x.items() if a == i)
+    m.add_constrs((pos(i) + 1 <= pos(k) for i, k in pre['precedence']), name="precedence")
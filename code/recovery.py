@@ -0,0 +1,114 @@
+
+from functools import lru_cache
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+from adversary import adv_perm
+
+#recoverable robust cost of a fixed first-stage schedule. with x fixed the
+#matching formulation (model3) is an LP over the swaps y[e], e in E, and the
+#duals pi, rho of the adversary:
+#
+#   min  sum_i p_bar[i]*c[i] + sum_e d[e]*y[e] + Gamma*pi + sum_i rho[i]
+#   s.t. rho[i] + pi >= p_hat[i]*(c[i] + sum_{e ni i} (pos[i] - pos[e\i])*y[e])
+#        sum_{e ni i} y[e] <= 1,  sum_e y[e] <= Delta,  y, pi, rho >= 0
+#
+#where pos[i] is the position of job i, c[i] = n+1-pos[i] and swapping the jobs
+#of e = (a,b) changes the nominal cost by d[e] = (pos[b]-pos[a])*(p_bar[b]-p_bar[a]).
+#the duals of the rho rows are the worst-case deviations delta. for fixed x
+#the symmetric y of model2 ranges over the same fractional-matching polytope
+#as the y of model3, so this is also the recoverable cost of model2
+
+#pairs E and the sparsity pattern of the LP rows, which only depend on n.
+#variables are [y (m), pi, rho (n)], rows are the n rho rows, the n degree
+#rows and the budget row
+@lru_cache(maxsize=None)
+def pattern(n):
+
+    E0, E1 = np.triu_indices(n, 1)
+    m = len(E0)
+    N, M = np.arange(n), np.arange(m)
+    rows = np.concatenate([E0, E1, N, N, n + E0, n + E1, np.full(m, 2*n)])
+    cols = np.concatenate([M, M, np.full(n, m), m + 1 + N, M, M, M])
+
+    return(E0, E1, rows, cols)
+
+#perm[j] is the job in position j
+def recovery_lp(p_bar, p_hat, Gamma, Delta, perm):
+
+    p_bar = np.asarray(p_bar, dtype=float)
+    p_hat = np.asarray(p_hat, dtype=float)
+    n = len(p_bar)
+    E0, E1, rows, cols = pattern(n)
+    m = len(E0)
+
+    pos = np.empty(n, dtype=int)
+    pos[np.asarray(perm)] = np.arange(n)
+    c = n + 1 - pos
+    d = (pos[E1] - pos[E0])*(p_bar[E1] - p_bar[E0])
+
+    cost = np.concatenate([d, [Gamma], np.ones(n)])
+    data = np.concatenate([p_hat[E0]*(pos[E0] - pos[E1]), p_hat[E1]*(pos[E1] - pos[E0]), -np.ones(2*n), np.ones(3*m)])
+    A_ub = sp.csr_matrix((data, (rows, cols)), shape=(2*n + 1, m + n + 1))
+    b_ub = np.concatenate([-p_hat*c, np.ones(n), [Delta]])
+
+    res = linprog(cost, A_ub=A_ub, b_ub=b_ub, bounds=(0, None), method="highs")
+
+    sol = {'objval':float(p_bar @ c + res.fun), 'y':res.x[:m], 'pi':float(res.x[m]), 'rho':res.x[m+1:], 'delta':-res.ineqlin.marginals[:n]}
+    return(sol)
+
+#objective values of the LPs of recovery_lp for a batch of schedules perm of
+#shape (B, n), solved as one block-diagonal LP per BATCH schedules. this
+#saves the set-up of a HiGHS call per schedule, which is about half of the
+#time of recovery_lp at n = 20
+def recovery_lp_batch(p_bar, p_hat, Gamma, Delta, perm):
+
+    p_bar = np.asarray(p_bar, dtype=float)
+    p_hat = np.asarray(p_hat, dtype=float)
+    perm = np.asarray(perm)
+    objval = np.empty(len(perm))
+    for start in range(0, len(perm), BATCH):
+        objval[start:start + BATCH] = block_lp(p_bar, p_hat, Gamma, Delta, perm[start:start + BATCH])
+
+    return(objval)
+
+#schedules per block-diagonal LP of recovery_lp_batch
+BATCH = 32
+
+def block_lp(p_bar, p_hat, Gamma, Delta, perm):
+
+    B, n = perm.shape
+    E0, E1, rows, cols = pattern(n)
+    m = len(E0)
+
+    pos = np.empty_like(perm)
+    np.put_along_axis(pos, perm, np.tile(np.arange(n), (B, 1)), axis=1)
+    c = n + 1 - pos
+    d = (pos[:, E1] - pos[:, E0])*(p_bar[E1] - p_bar[E0])
+
+    #block b has the rows and columns of recovery_lp shifted by b blocks
+    cost = np.concatenate([d, np.full((B, 1), Gamma), np.ones((B, n))], axis=1)
+    data = np.concatenate([p_hat[E0]*(pos[:, E0] - pos[:, E1]), p_hat[E1]*(pos[:, E1] - pos[:, E0]), -np.ones((B, 2*n)), np.ones((B, 3*m))], axis=1)
+    block = np.arange(B)[:, None]
+    A_ub = sp.csr_matrix((data.ravel(), ((rows + (2*n + 1)*block).ravel(), (cols + (m + n + 1)*block).ravel())), shape=(B*(2*n + 1), B*(m + n + 1)))
+    b_ub = np.concatenate([-p_hat*c, np.ones((B, n)), np.full((B, 1), Delta)], axis=1)
+
+    res = linprog(cost.ravel(), A_ub=A_ub, b_ub=b_ub.ravel(), bounds=(0, None), method="highs")
+
+    return((p_bar*c).sum(axis=1) + (cost*res.x.reshape(B, -1)).sum(axis=1))
+
+#exact recoverable robust objective of one schedule perm of shape (n,) or of a
+#batch of shape (B, n). with Delta = 0 there is no recourse and the closed
+#form adv_perm applies, vectorised over the batch. otherwise every schedule
+#costs an LP: at n = 20 about 350 schedules per second one by one and about
+#800 per second in a batch, so heuristics that evaluate many schedules should
+#pass them as a batch
+def recoverable_cost(p_bar, p_hat, Gamma, Delta, perm):
+
+    perm = np.asarray(perm)
+    if Delta == 0:
+        return(adv_perm(p_bar, p_hat, Gamma, perm))
+    if perm.ndim == 1:
+        return(recovery_lp(p_bar, p_hat, Gamma, Delta, perm)['objval'])
+
+    return(recovery_lp_batch(p_bar, p_hat, Gamma, Delta, perm))
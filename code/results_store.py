@@ -0,0 +1,146 @@
+
+from contextlib import closing
+import json
+import sqlite3
+import time
+
+#sqlite results store. one row per solved cell, keyed by
+#(method, instance, n, Gamma, Delta, K, time_limit), in WAL mode so that
+#concurrent workers can each commit their own row while others read.
+#methods that do not depend on K are stored with K = 0, see uses_K. the
+#statistics of solution.py are stored alongside, NULL where a method did not
+#record them, and so is the schedule of the sol ('perm', as json) where a method has one
+
+#SQL types of the statistics columns
+STATISTICS = {'build_time':'REAL', 'optimize_time':'REAL', 'num_vars':'INTEGER', 'num_constrs':'INTEGER', 'num_nzs':'INTEGER',
+              'presolved_vars':'INTEGER', 'presolved_constrs':'INTEGER', 'presolved_nzs':'INTEGER', 'node_count':'INTEGER',
+              'iter_count':'INTEGER', 'peak_rss_mb':'REAL'}
+
+COLUMNS = ['method', 'instance', 'n', 'Gamma', 'Delta', 'K', 'time_limit', 'status', 'objbound', 'objval', 'mipgap', 'runtime', 'finished'] + list(STATISTICS) + ['perm']
+KEY = ['method', 'instance', 'n', 'Gamma', 'Delta', 'K', 'time_limit']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    method TEXT NOT NULL,
+    instance INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    Gamma REAL NOT NULL,
+    Delta INTEGER NOT NULL,
+    K INTEGER NOT NULL,
+    time_limit REAL NOT NULL,
+    status INTEGER,
+    objbound REAL,
+    objval REAL,
+    mipgap REAL,
+    runtime REAL,
+    finished REAL,
+{}
+    perm TEXT,
+    PRIMARY KEY (method, instance, n, Gamma, Delta, K, time_limit)
+)
+""".format("\n".join("    {} {},".format(name, sql_type) for name, sql_type in STATISTICS.items()))
+
+def connect(store):
+
+    conn = sqlite3.connect(store, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(SCHEMA)
+    #stores created before the statistics and perm columns were added
+    existing = set(row[1] for row in conn.execute("PRAGMA table_info(results)"))
+    for name, sql_type in list(STATISTICS.items()) + [('perm', 'TEXT')]:
+        if name not in existing:
+            conn.execute("ALTER TABLE results ADD COLUMN {} {}".format(name, sql_type))
+
+    return(conn)
+
+#whether the results of method depend on K: the general methods and the
+#portfolio, whose default methods include model1
+def uses_K(method):
+
+    return(method.startswith('general') or method == 'portfolio')
+
+#primary key of a runner cell
+def cell_key(cell):
+
+    K = cell['K'] if uses_K(cell['method']) else 0
+
+    return((cell['method'], cell['instance'], cell['n'], cell['Gamma'], cell['Delta'], K, cell['time_limit']))
+
+#stores one finished cell in its own transaction. a rerun of the same cell
+#replaces the previous row
+def save_result(store, cell, sol):
+
+    row = cell_key(cell) + (sol['status'], sol['objbound'], sol['objval'], sol['mipgap'], sol['runtime'], time.time())
+    row += tuple(sol.get(name) for name in STATISTICS)
+    row += (json.dumps([int(i) for i in sol['perm']]) if sol.get('perm') is not None else None,)
+    with closing(connect(store)) as conn:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO results ({}) VALUES ({})".format(", ".join(COLUMNS), ", ".join("?"*len(COLUMNS))), row)
+
+def finished_keys(store):
+
+    with closing(connect(store)) as conn:
+        rows = conn.execute("SELECT {} FROM results".format(", ".join(KEY))).fetchall()
+
+    return(set(rows))
+
+#rows of the cells that are in the store, keyed by cell_key, with 'perm'
+#decoded (None if the method did not store a schedule)
+def finished_rows(store, cells):
+
+    keys = set(cell_key(cell) for cell in cells)
+    with closing(connect(store)) as conn:
+        cur = conn.execute("SELECT {} FROM results".format(", ".join(COLUMNS)))
+        rows = [dict(zip(COLUMNS, row)) for row in cur.fetchall()]
+
+    finished = {}
+    for row in rows:
+        key = tuple(row[name] for name in KEY)
+        if key in keys:
+            row['perm'] = json.loads(row['perm']) if row['perm'] is not None else None
+            finished[key] = row
+    return(finished)
+
+#cells that have no row in the store yet
+def pending_cells(store, cells):
+
+    finished = finished_keys(store)
+
+    return([cell for cell in cells if cell_key(cell) not in finished])
+
+#rows of one method, optionally only those of one K and time limit. K is
+#that of the runner, methods that do not depend on K match K = 0. raises
+#a ValueError if a (instance, n, Gamma, Delta) cell still has several rows,
+#i.e. the store holds several K or time limits that were not selected
+def load_results(store, method, K=None, time_limit=None):
+
+    where, params = ["method = ?"], [method]
+    if K is not None:
+        where.append("K = ?")
+        params.append(K if uses_K(method) else 0)
+    if time_limit is not None:
+        where.append("time_limit = ?")
+        params.append(time_limit)
+    with closing(connect(store)) as conn:
+        cur = conn.execute("SELECT {} FROM results WHERE {} ORDER BY n, instance, Gamma, Delta, K, time_limit".format(", ".join(COLUMNS), " AND ".join(where)), params)
+        rows = [dict(zip(COLUMNS, row)) for row in cur.fetchall()]
+
+    cells = [(row['instance'], row['n'], row['Gamma'], row['Delta']) for row in rows]
+    if len(set(cells)) < len(cells):
+        raise ValueError("store {} has several rows per cell for method {}, select K and time_limit".format(store, method))
+
+    return(rows)
+
+#writes the rows of one method in the tab separated format of results/*.txt
+def export_text(store, method, results_file, K=None, time_limit=None):
+
+    general = uses_K(method)
+    columns = ['instance', 'n', 'Gamma', 'Delta'] + (['K'] if general else []) + ['status', 'objbound', 'objval', 'mipgap', 'runtime']
+
+    with open(results_file, 'w') as f:
+        f.write(" \t ".join(columns) + " \n")
+        for row in load_results(store, method, K, time_limit):
+            values = [row['instance'], row['n'], "{:g}".format(row['Gamma']), row['Delta']] + ([row['K']] if general else [])
+            values += [row['status'], "{:.2f}".format(row['objbound']), "{:.2f}".format(row['objval']), "{:.4f}".format(row['mipgap']), "{:.2f}".format(row['runtime'])]
+            f.write(" \t ".join(str(v) for v in values) + " \n")
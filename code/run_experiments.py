@@ -0,0 +1,146 @@
+
+import argparse
+import ast
+import glob
+import os
+from assignment import model2, model2_ws
+from benders import benders
+from ccg import ccg
+from cpsat import cpsat
+from formulations import solve_formulation
+from general import model1, model1_lazy, model1_ws
+from matching import model3, model3_ws
+import minmax
+import model_cache
+from pipeline import solve_with_bounds
+from portfolio import portfolio
+from results_store import export_text, pending_cells, save_result
+from worker_pool import JobError, SolverPool
+
+#batch runner for the (method, instance, Gamma, Delta, K) grid behind the
+#files in results/. cells are solved in a SolverPool, whose workers keep
+#their Gurobi environment between cells, and the total core budget is split
+#evenly between the concurrent solves. every worker commits
+#its sol to the results store as soon as its cell finishes, and cells that
+#already have a row in the store are skipped, so an interrupted sweep resumes
+#where it stopped. a cell whose solve fails is reported and left without a
+#row, so the next run tries it again. the min-max warm starts of the *_ws methods are shared
+#between workers through the on-disk warm-start cache, and with
+#--model-cache-dir the models of the *_bounds methods are built once and then
+#read from the model cache of model_cache.py
+
+METHODS = ['general', 'general_ws', 'assignment', 'assignment_ws', 'matching', 'matching_ws']
+
+#the exact formulations behind the bounds pipeline, see pipeline.py
+BOUNDS_METHODS = {'general_bounds':'model1', 'assignment_bounds':'model2', 'matching_bounds':'model3'}
+
+#the formulations on the licence-free backends of backend.py, e.g.
+#'assignment_highs' is model2 solved with HiGHS
+BACKEND_METHODS = {'{}_{}'.format(method, backend):(formulation, backend) for method, formulation in [('general', 'model1'), ('assignment', 'model2'), ('matching', 'model3')]
+                   for backend in ['highs', 'scip']}
+
+#(Gamma, Delta) pairs of the published sweep
+GRID = [(3,2), (5,2), (7,0), (7,1), (7,2), (7,3)]
+
+#each line of an instance file holds n, p_bar and p_hat (the file header
+#lists the two vectors the other way round)
+def read_instances(instance_file):
+
+    instances = []
+    with open(instance_file) as f:
+        for line in f.readlines()[1:]:
+            if not line.strip():
+                continue
+            fields = line.split('\t')
+            instances.append((ast.literal_eval(fields[1].strip()), ast.literal_eval(fields[2].strip())))
+
+    return(instances)
+
+def solve(method, p_bar, p_hat, Gamma, Delta, K, time_limit, threads, env=None):
+
+    if method == 'general':
+        return(model1(p_bar, p_hat, Gamma, Delta, K, time_limit, threads=threads, env=env))
+    if method == 'general_ws':
+        return(model1_ws(p_bar, p_hat, Gamma, Delta, K, time_limit, threads=threads, env=env))
+    if method == 'assignment':
+        return(model2(p_bar, p_hat, Gamma, Delta, time_limit, threads=threads, env=env))
+    if method == 'assignment_ws':
+        return(model2_ws(p_bar, p_hat, Gamma, Delta, time_limit, threads=threads, env=env))
+    if method == 'matching':
+        return(model3(p_bar, p_hat, Gamma, Delta, time_limit, threads=threads, env=env))
+    if method == 'matching_ws':
+        return(model3_ws(p_bar, p_hat, Gamma, Delta, time_limit, threads=threads, env=env))
+    if method == 'assignment_benders':
+        return(benders(p_bar, p_hat, Gamma, Delta, time_limit, threads=threads, env=env))
+    if method == 'ccg':
+        return(ccg(p_bar, p_hat, Gamma, Delta, time_limit, threads=threads, env=env))
+    if method == 'general_cp':
+        return(cpsat(p_bar, p_hat, Gamma, Delta, K, time_limit, threads=threads))
+    if method == 'general_lazy':
+        return(model1_lazy(p_bar, p_hat, Gamma, Delta, K, time_limit, threads=threads, env=env))
+    if method in BOUNDS_METHODS:
+        return(solve_with_bounds(BOUNDS_METHODS[method], p_bar, p_hat, Gamma, Delta, time_limit, K=K, threads=threads, env=env))
+    if method in BACKEND_METHODS:
+        formulation, backend = BACKEND_METHODS[method]
+        return(solve_formulation(formulation, backend, p_bar, p_hat, Gamma, Delta, time_limit, K=K, threads=threads))
+    if method == 'portfolio':
+        #all formulations race on the threads of the cell
+        return(portfolio(p_bar, p_hat, Gamma, Delta, time_limit, K=K, cores=threads))
+    raise ValueError("unknown method {}".format(method))
+
+def solve_cell(cell, env=None):
+
+    minmax.ws_cache.cache_dir = cell['warmstart_dir']
+    model_cache.artifacts.cache_dir, model_cache.artifacts.max_bytes = cell['model_cache_dir'], cell['model_cache_bytes']
+    sol = solve(cell['method'], cell['p_bar'], cell['p_hat'], cell['Gamma'], cell['Delta'], cell['K'], cell['time_limit'], cell['threads'], env)
+    save_result(cell['store'], cell, sol)
+
+    return(cell, sol)
+
+def cells(methods, instance_files, grid, K, time_limit, threads, store, warmstart_dir=None, model_cache_dir=None, model_cache_bytes=10*2**30):
+
+    for method in methods:
+        for instance_file in instance_files:
+            for instance, (p_bar, p_hat) in enumerate(read_instances(instance_file), start=1):
+                for Gamma, Delta in grid:
+                    yield {'method':method, 'instance':instance, 'n':len(p_bar), 'p_bar':p_bar, 'p_hat':p_hat,
+                           'Gamma':Gamma, 'Delta':Delta, 'K':K, 'time_limit':time_limit, 'threads':threads, 'store':store,
+                           'warmstart_dir':warmstart_dir, 'model_cache_dir':model_cache_dir, 'model_cache_bytes':model_cache_bytes}
+
+def run(methods, instance_files, grid, K, time_limit, cores, workers, store, warmstart_dir=None, model_cache_dir=None, model_cache_bytes=10*2**30):
+
+    threads = max(1, cores // workers)
+    todo = pending_cells(store, cells(methods, instance_files, grid, K, time_limit, threads, store, warmstart_dir, model_cache_dir, model_cache_bytes))
+
+    with SolverPool(workers) as pool:
+        submitted = {pool.submit(solve_cell, cell):cell for cell in todo}
+        for key, result in pool.as_completed():
+            if isinstance(result, JobError):
+                cell = submitted[key]
+                print(cell['method'], cell['n'], cell['instance'], cell['Gamma'], cell['Delta'], 'error', result)
+                continue
+            cell, sol = result
+            print(cell['method'], cell['n'], cell['instance'], cell['Gamma'], cell['Delta'], sol['status'], sol['objval'], sol['runtime'])
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--methods", nargs="+", default=METHODS, choices=METHODS + ['general_lazy', 'general_cp', 'assignment_benders', 'ccg'] + list(BOUNDS_METHODS) + list(BACKEND_METHODS) + ['portfolio'])
+    parser.add_argument("--instances", nargs="+", default=sorted(glob.glob("../instances/*.txt")))
+    parser.add_argument("--K", type=int, default=2)
+    parser.add_argument("--time-limit", type=float, default=600)
+    parser.add_argument("--cores", type=int, default=os.cpu_count())
+    parser.add_argument("--workers", type=int, default=max(1, os.cpu_count() // 4))
+    parser.add_argument("--store", default="../results/results.db")
+    parser.add_argument("--warmstart-dir", default="../results/warmstarts", help="on-disk cache of min-max warm starts")
+    parser.add_argument("--model-cache-dir", help="on-disk cache of built models, see model_cache.py")
+    parser.add_argument("--model-cache-gb", type=float, default=10, help="size limit of the model cache")
+    parser.add_argument("--export-dir", help="write <method>_results.txt files from the store after the sweep")
+    args = parser.parse_args()
+
+    run(args.methods, args.instances, GRID, args.K, args.time_limit, args.cores, args.workers, args.store, args.warmstart_dir, args.model_cache_dir, int(args.model_cache_gb*2**30))
+
+    if args.export_dir is not None:
+        os.makedirs(args.export_dir, exist_ok=True)
+        for method in args.methods:
+            export_text(args.store, method, os.path.join(args.export_dir, "{}_results.txt".format(method)), args.K, args.time_limit)
@@ -0,0 +1,75 @@
+
+import argparse
+import multiprocessing as mp
+import random
+from gurobipy import *
+from assignment import build_model2
+from general import build_model1, build_model1_lazy
+from matching import build_model3
+from minmax import build_min_max
+from solution import peak_rss
+
+#size of the built formulations: variables, constraints and nonzeros as
+#Gurobi reports them and the peak resident set size of the process that
+#built the model. each model is built in a fresh process so that the peak
+#memory of one build does not carry over to the next
+
+FORMULATIONS = ['min_max', 'model1', 'model1_lazy', 'model2', 'model3']
+
+def model_size(model):
+
+    model.update()
+    size = {'vars':model.NumVars, 'constrs':model.NumConstrs, 'nonzeros':model.NumNZs}
+    return(size)
+
+def build(formulation, p_bar, p_hat, Gamma, Delta, K):
+
+    if formulation == 'min_max':
+        return(build_min_max(p_bar, p_hat, Gamma, 600))
+    if formulation == 'model1':
+        return(build_model1(p_bar, p_hat, Gamma, Delta, K, 600))
+    if formulation == 'model1_lazy':
+        return(build_model1_lazy(p_bar, p_hat, Gamma, Delta, K, 600))
+    if formulation == 'model2':
+        return(build_model2(p_bar, p_hat, Gamma, Delta, 600))
+    if formulation == 'model3':
+        return(build_model3(p_bar, p_hat, Gamma, Delta, 600))
+    raise ValueError("unknown formulation {}".format(formulation))
+
+def build_size(formulation, p_bar, p_hat, Gamma, Delta, K, queue):
+
+    model, var = build(formulation, p_bar, p_hat, Gamma, Delta, K)
+    size = model_size(model)
+    size['build_time'] = model._build_time
+    size['peak_rss_mb'] = peak_rss()
+    queue.put(size)
+
+#size of one formulation for an instance, built in a separate process
+def size(formulation, p_bar, p_hat, Gamma, Delta, K=2):
+
+    queue = mp.Queue()
+    process = mp.Process(target=build_size, args=(formulation, p_bar, p_hat, Gamma, Delta, K, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+
+    return(result)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", nargs="+", type=int, default=[10, 15, 20])
+    parser.add_argument("--formulations", nargs="+", default=FORMULATIONS, choices=FORMULATIONS)
+    parser.add_argument("--Gamma", type=float, default=3)
+    parser.add_argument("--Delta", type=int, default=2)
+    parser.add_argument("--K", type=int, default=2)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(" \t ".join(['formulation', 'n', 'vars', 'constrs', 'nonzeros', 'build_time', 'peak_rss_mb']))
+    for n in args.n:
+        p_bar = [random.randint(1, 100) for i in range(n)]
+        p_hat = [random.randint(1, 100) for i in range(n)]
+        for formulation in args.formulations:
+            s = size(formulation, p_bar, p_hat, args.Gamma, args.Delta, args.K)
+            print(" \t ".join(str(v) for v in [formulation, n, s['vars'], s['constrs'], s['nonzeros'], "{:.2f}".format(s['build_time']), "{:.1f}".format(s['peak_rss_mb'])]))
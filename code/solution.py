@@ -0,0 +1,87 @@
+from gurobipy import *
+from memory import peak_rss
+import re
+import time
+
+#statistics reported with every sol, so that a slow solve can be traced to
+#model construction, presolve or branching. builders record their wall time
+#in model._build_time and optimize() the wall time of the solve and the size
+#of the presolved model, which Gurobi only reports in its log. the log lines
+#are passed to MESSAGE callbacks also when OutputFlag is 0
+STATISTICS = ['build_time', 'optimize_time', 'num_vars', 'num_constrs', 'num_nzs', 'presolved_vars', 'presolved_constrs',
+              'presolved_nzs', 'node_count', 'iter_count', 'peak_rss_mb']
+
+PRESOLVED = re.compile(r"Presolved: (\d+) rows, (\d+) columns, (\d+) nonzeros")
+
+#optimizes model with callback, recording the wall time of the solve and the
+#presolved size
+def optimize(model, callback=None):
+
+    def log(model, where):
+        if where == GRB.Callback.MESSAGE:
+            message = model.cbGet(GRB.Callback.MSG_STRING)
+            if message.startswith("Presolve: All rows and columns removed"):
+                model._presolved = (0, 0, 0)
+            match = PRESOLVED.match(message)
+            if match and model._presolved is None:
+                model._presolved = tuple(int(v) for v in match.groups())
+        if callback is not None:
+            callback(model, where)
+
+    model._presolved = None
+    start = time.time()
+    model.optimize(log)
+    model._optimize_time = time.time() - start
+
+#statistics of a solved model. entries that were not recorded are None
+def statistics(model):
+
+    rows, columns, nonzeros = getattr(model, '_presolved', None) or (None, None, None)
+    stats = {'build_time':getattr(model, '_build_time', None), 'optimize_time':getattr(model, '_optimize_time', None),
+             'num_vars':model.NumVars, 'num_constrs':model.NumConstrs, 'num_nzs':model.NumNZs,
+             'presolved_vars':columns, 'presolved_constrs':rows, 'presolved_nzs':nonzeros,
+             'node_count':int(model.NodeCount) if model.IsMIP else 0, 'iter_count':int(model.IterCount), 'peak_rss_mb':peak_rss()}
+    return(stats)
+
+#sol dict reported by every solve
+def get_sol(model):
+
+    sol = {'status':model.Status, 'objbound':model.ObjBound, 'objval':model.ObjVal, 'mipgap':model.MIPGap, 'runtime':model.Runtime}
+    sol.update(statistics(model))
+    return(sol)
+
+#flat variable and value lists of a MIP start. arrays maps variable names of
+#var to arrays indexed by the keys of their tupledicts
+def start_lists(var, arrays, pi):
+
+    variables, values = [var['pi']], [float(pi)]
+    for name, array in arrays.items():
+        variables += list(var[name].values())
+        values += [float(array[key]) for key in var[name].keys()]
+
+    return(variables, values)
+
+#callback that records the objective of the first incumbent. a MIP start that
+#Gurobi accepts is loaded as the first incumbent, before presolve
+def first_incumbent(model, where):
+
+    if where == GRB.Callback.MIPSOL and model._first_incumbent is None:
+        model._first_incumbent = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+
+#solves a model whose MIP start has objective start_objval. besides get_sol,
+#sol reports the start objective and whether Gurobi accepted the start, i.e.
+#whether its first incumbent has the objective of the start
+def optimize_from_start(model, start_objval):
+
+    model._first_incumbent = None
+    optimize(model, first_incumbent)
+
+    sol = get_sol(model)
+    sol['start_objval'] = float(start_objval)
+    sol['start_accepted'] = start_accepted(model, start_objval)
+    return(sol)
+
+#whether the first incumbent recorded by first_incumbent is the start
+def start_accepted(model, start_objval):
+
+    return(bool(model._first_incumbent is not None and abs(model._first_incumbent - start_objval) <= 1e-6*max(1, abs(start_objval))))
@@ -1,16 +1,12 @@
 
-from gurobipy import *
+from adversary import adv_perm
 
 def sorting(p_bar, p_hat, l, Gamma):
     
     n = len(p_bar)
     N = [i for i in range(n)]
 
-    #l=0 => sort by nom. values p_bar
-    #l=1 => sort by worst-case values p_bar+p_hat
-    p = [p_bar[i] + l*p_hat[i] for i in N]
-
-    N_sorted = sorted(N, key=lambda i:p[i])
+    N_sorted = sorting_schedule(p_bar, p_hat, l)
     print(N_sorted)
 
     #get N_sorted in terms of x
@@ -23,30 +19,21 @@ def sorting(p_bar, p_hat, l, Gamma):
                 x[i].append(0)
     print(x)
     
-    #evaluate soln by solving adv(x)        
-    objval = adv(p_bar, p_hat, Gamma, x)
+    #evaluate soln with adv
+    objval = float(adv_perm(p_bar, p_hat, Gamma, N_sorted))
 
     return(objval)
-    
-def adv(p_bar, p_hat, Gamma, x):
-    
-    n = len(p_bar)
-    N = [i for i in range(n)]
 
-    model = Model("adv")
-#    model.setParam("OutputFlag", 0)
-    
-    #variables
-    delta = model.addVars([i for i in N], vtype=GRB.CONTINUOUS, name="delta", lb=0, ub=1)
+#N_sorted[j] is the job in position j
+def sorting_schedule(p_bar, p_hat, l):
 
-    #objective
-    model.setObjective(quicksum((p_bar[i] + delta[i]*p_hat[i])*(n+1-j)*x[i][j] for i in N for j in N), GRB.MAXIMIZE)
-    
-    #constraints
-    model.addConstr(quicksum(delta[i] for i in N) <= Gamma)
+    n = len(p_bar)
+    N = [i for i in range(n)]
 
-    model.optimize()
+    #l=0 => sort by nom. values p_bar
+    #l=1 => sort by worst-case values p_bar+p_hat
+    p = [p_bar[i] + l*p_hat[i] for i in N]
 
-    model.write('sorting_adv.sol')
+    N_sorted = sorted(N, key=lambda i:p[i])
 
-    return(model.objval)
+    return(N_sorted)
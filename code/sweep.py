@@ -0,0 +1,123 @@
+
+import argparse
+import glob
+import os
+import time
+import model_cache
+from pipeline import bounds, closed, schedule_value, solve_from_bounds
+from results_store import cell_key, finished_rows, pending_cells, save_result
+from run_experiments import GRID, read_instances
+from worker_pool import JobError, SolverPool
+
+#monotone sweep over the (Gamma, Delta) cells of one instance. the optimal
+#value of model1, model2 and model3 is non-decreasing in Gamma (pi >= 0) and
+#non-increasing in Delta (a larger budget only relaxes the recovery), so the
+#bound of a finished cell (Gamma', Delta') with Gamma' <= Gamma and
+#Delta' >= Delta is a lower bound of (Gamma, Delta). the cells are solved by
+#Gamma ascending and Delta descending, so every such cell is finished first.
+#the schedules of the finished cells are evaluated in every later cell and
+#the best one is the upper bound, MIP start and Cutoff of its solve, next to
+#the heuristic bounds of pipeline.bounds. cells whose bounds meet are not
+#solved at all ('closed_by' is 'bounds', as in the bounds pipeline). cells
+#already in the store are not solved again, their stored bound and schedule
+#seed the sweep instead
+
+#runner methods of the sweep and their formulations
+SWEEP_METHODS = {'general_sweep':'model1', 'assignment_sweep':'model2', 'matching_sweep':'model3'}
+
+def order(grid):
+
+    return(sorted(grid, key=lambda cell:(cell[0], -cell[1])))
+
+#best objective bound of the finished cells that bound (Gamma, Delta) from below
+def monotone_bound(sols, Gamma, Delta):
+
+    lbs = [sol['objbound'] for (G, D), sol in sols.items() if G <= Gamma and D >= Delta]
+
+    return(max(lbs, default=None))
+
+#solves the cells of grid for one instance in monotone order. seeds holds
+#finished cells by (Gamma, Delta), sols with at least 'objbound' and 'perm'
+#(None if unknown), which are not solved again. on_solved, if given, is
+#called with (Gamma, Delta) and the sol as soon as a cell is solved. returns
+#the sol of every solved cell keyed by (Gamma, Delta). time_limit is per cell
+def sweep(formulation, p_bar, p_hat, grid, time_limit, K=2, threads=4, relaxation=False, env=None, seeds=None, on_solved=None):
+
+    seeds = seeds or {}
+    sols = dict(seeds)
+    for Gamma, Delta in order(grid):
+        if (Gamma, Delta) in sols:
+            continue
+        start = time.time()
+        bnd = bounds(formulation, p_bar, p_hat, Gamma, Delta, time_limit, threads, env)
+
+        lb = monotone_bound(sols, Gamma, Delta)
+        if lb is not None and lb > bnd['lb']:
+            bnd['lb'], bnd['lb_source'] = lb, 'sweep'
+        if not closed(bnd['lb'], bnd['ub']):
+            for sol in sols.values():
+                if sol['perm'] is None:
+                    continue
+                value = schedule_value(formulation, p_bar, p_hat, Gamma, Delta, sol['perm'])
+                if value < bnd['ub']:
+                    bnd['ub'], bnd['ub_source'], bnd['perm'] = value, 'sweep', list(sol['perm'])
+
+        sols[Gamma, Delta] = solve_from_bounds(formulation, bnd, p_bar, p_hat, Gamma, Delta, time_limit, K, threads, relaxation, start, env)
+        if on_solved is not None:
+            on_solved(Gamma, Delta, sols[Gamma, Delta])
+
+    return({cell:sol for cell, sol in sols.items() if cell not in seeds})
+
+#sweeps the pending cells of one instance, seeded with its finished cells,
+#and commits every cell to the store as soon as it is solved, so that an
+#interrupted sweep keeps the cells it finished
+def sweep_instance(job, env=None):
+
+    model_cache.artifacts.cache_dir, model_cache.artifacts.max_bytes = job['model_cache_dir'], job['model_cache_bytes']
+    cells = {(Gamma, Delta):dict(job['cell'], Gamma=Gamma, Delta=Delta) for Gamma, Delta in job['grid']}
+    finished = finished_rows(job['store'], cells.values())
+    seeds = {(Gamma, Delta):finished[cell_key(cell)] for (Gamma, Delta), cell in cells.items() if cell_key(cell) in finished}
+    sols = sweep(job['formulation'], job['p_bar'], job['p_hat'], job['grid'], job['time_limit'], job['K'], job['threads'], env=env, seeds=seeds,
+                 on_solved=lambda Gamma, Delta, sol: save_result(job['store'], cells[Gamma, Delta], sol))
+
+    return(job, sols)
+
+#one job per instance with a cell of the grid that has no row in the store
+def jobs(methods, instance_files, grid, K, time_limit, threads, store, model_cache_dir=None, model_cache_bytes=10*2**30):
+
+    for method in methods:
+        for instance_file in instance_files:
+            for instance, (p_bar, p_hat) in enumerate(read_instances(instance_file), start=1):
+                cell = {'method':method, 'instance':instance, 'n':len(p_bar), 'K':K, 'time_limit':time_limit}
+                if pending_cells(store, [dict(cell, Gamma=Gamma, Delta=Delta) for Gamma, Delta in grid]):
+                    yield {'formulation':SWEEP_METHODS[method], 'cell':cell, 'p_bar':p_bar, 'p_hat':p_hat, 'grid':grid,
+                           'K':K, 'time_limit':time_limit, 'threads':threads, 'store':store,
+                           'model_cache_dir':model_cache_dir, 'model_cache_bytes':model_cache_bytes}
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--methods", nargs="+", default=list(SWEEP_METHODS), choices=list(SWEEP_METHODS))
+    parser.add_argument("--instances", nargs="+", default=sorted(glob.glob("../instances/*.txt")))
+    parser.add_argument("--K", type=int, default=2)
+    parser.add_argument("--time-limit", type=float, default=600)
+    parser.add_argument("--cores", type=int, default=os.cpu_count())
+    parser.add_argument("--workers", type=int, default=max(1, os.cpu_count() // 4))
+    parser.add_argument("--store", default="../results/results.db")
+    parser.add_argument("--model-cache-dir", help="on-disk cache of built models, see model_cache.py")
+    parser.add_argument("--model-cache-gb", type=float, default=10, help="size limit of the model cache")
+    args = parser.parse_args()
+
+    threads = max(1, args.cores // args.workers)
+    with SolverPool(args.workers) as pool:
+        submitted = {pool.submit(sweep_instance, job):job for job in jobs(args.methods, args.instances, GRID, args.K, args.time_limit, threads, args.store,
+                                                                          args.model_cache_dir, int(args.model_cache_gb*2**30))}
+        for key, result in pool.as_completed():
+            if isinstance(result, JobError):
+                #the cells solved before the failure are in the store already
+                job = submitted[key]
+                print(job['cell']['method'], job['cell']['n'], job['cell']['instance'], 'error', result)
+                continue
+            job, sols = result
+            for (Gamma, Delta), sol in sols.items():
+                print(job['cell']['method'], job['cell']['n'], job['cell']['instance'], Gamma, Delta, sol['status'], sol['objval'], sol['closed_by'], sol['runtime'])
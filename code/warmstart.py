@@ -0,0 +1,68 @@
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+
+#cache of warm starts keyed by instance content and Gamma. entries live in an
+#in-memory LRU of at most maxsize entries and, if cache_dir is given, in one
+#json file per key so that other processes and later runs can reuse them
+
+def instance_hash(p_bar, p_hat):
+
+    data = json.dumps([[float(p) for p in p_bar], [float(p) for p in p_hat]])
+
+    return(hashlib.sha256(data.encode()).hexdigest())
+
+class WarmStartCache:
+
+    def __init__(self, maxsize=1024, cache_dir=None):
+
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, p_bar, p_hat, Gamma):
+
+        return("{}_{}".format(instance_hash(p_bar, p_hat), repr(float(Gamma))))
+
+    def path(self, key):
+
+        return(os.path.join(self.cache_dir, key + ".json"))
+
+    def get(self, p_bar, p_hat, Gamma):
+
+        key = self.key(p_bar, p_hat, Gamma)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return(self.entries[key])
+        if self.cache_dir is not None and os.path.exists(self.path(key)):
+            with open(self.path(key)) as f:
+                entry = json.load(f)
+            self.remember(key, entry)
+            self.hits += 1
+            return(entry)
+        self.misses += 1
+
+        return(None)
+
+    def put(self, p_bar, p_hat, Gamma, entry):
+
+        key = self.key(p_bar, p_hat, Gamma)
+        self.remember(key, entry)
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = "{}.{}.tmp".format(self.path(key), os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp, self.path(key))
+
+    def remember(self, key, entry):
+
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
@@ -0,0 +1,161 @@
+
+import inspect
+import itertools
+import multiprocessing as mp
+import os
+import queue
+from gurobipy import Env
+from memory import reset_peak_rss
+
+#long-lived pool of solver processes. every worker imports the solver modules
+#and starts its Gurobi environment once and then takes jobs from a queue, so
+#a job pays neither interpreter start-up nor environment start-up (with a
+#token or WLS licence also the licence checkout). the in-memory caches of a
+#worker, e.g. the min-max warm starts of minmax.ws_cache, persist between its
+#jobs as well. a job is a module-level function with its arguments; functions
+#with an env parameter (the Gurobi builders and solves) get the environment
+#of the worker. the peak memory of memory.py is reset before every job, so
+#the peak_rss_mb of a sol is that of its own job.
+#
+#a job that raises, or whose worker dies (e.g. killed for running out of
+#memory), is yielded by as_completed with a JobError in place of its result
+#and the pool goes on with the other jobs; a dead worker is replaced. only
+#leaving the pool with a KeyboardInterrupt drops the queued jobs and stops
+#the workers at once
+
+#parameters of the worker environments
+PARAMS = {'OutputFlag':0}
+
+#seconds between liveness checks of the workers while waiting for results
+POLL = 1
+
+def serve(tasks, results, params):
+
+    env = Env(empty=True)
+    for name, value in params.items():
+        env.setParam(name, value)
+    env.start()
+
+    while True:
+        job = tasks.get()
+        if job is None:
+            break
+        key, function, args, kwargs = job
+        results.put(('start', key, os.getpid()))
+        if 'env' in inspect.signature(function).parameters:
+            kwargs = dict(kwargs, env=env)
+        reset_peak_rss()
+        try:
+            results.put(('done', key, function(*args, **kwargs)))
+        except Exception as e:
+            results.put(('error', key, "{}: {}".format(type(e).__name__, e)))
+
+    env.dispose()
+
+#result of a job that raised or whose worker died
+class JobError(Exception):
+
+    pass
+
+class SolverPool:
+
+    def __init__(self, workers, params=None):
+
+        self.tasks, self.results = mp.Queue(), mp.Queue()
+        self.keys = itertools.count()
+        self.pending = 0
+        #key of the job each worker is running, by pid
+        self.running = {}
+        self.params = dict(PARAMS, **(params or {}))
+        self.processes = [self.start_worker() for _ in range(workers)]
+
+    def __enter__(self):
+
+        return(self)
+
+    def __exit__(self, exc_type, *exc):
+
+        self.close(cancel=exc_type is not None and issubclass(exc_type, KeyboardInterrupt))
+
+    def start_worker(self):
+
+        process = mp.Process(target=serve, args=(self.tasks, self.results, self.params))
+        process.start()
+        return(process)
+
+    #queues function(*args, **kwargs) and returns the key of the job
+    def submit(self, function, *args, **kwargs):
+
+        key = next(self.keys)
+        self.tasks.put((key, function, args, kwargs))
+        self.pending += 1
+        return(key)
+
+    #replaces the workers that died and returns (key, JobError) of the jobs
+    #they were running
+    def replace_dead(self):
+
+        failed = []
+        for w, process in enumerate(self.processes):
+            if process.exitcode is not None:
+                key = self.running.pop(process.pid, None)
+                if key is not None:
+                    failed.append((key, JobError("worker {} exited with code {} while running job {}".format(process.pid, process.exitcode, key))))
+                self.processes[w] = self.start_worker()
+        return(failed)
+
+    #yields (key, result) of the queued jobs as they finish, with a JobError
+    #as the result of a job that raised or whose worker died
+    def as_completed(self):
+
+        while self.pending > 0:
+            try:
+                kind, key, value = self.results.get(timeout=POLL)
+            except queue.Empty:
+                for key, error in self.replace_dead():
+                    self.pending -= 1
+                    yield(key, error)
+                continue
+            if kind == 'start':
+                self.running[value] = key
+                continue
+            self.pending -= 1
+            self.running = {pid:job for pid, job in self.running.items() if job != key}
+            if kind == 'error':
+                value = JobError("job {} failed: {}".format(key, value))
+            yield(key, value)
+
+    #results of function over the argument tuples of args_list, in order,
+    #with a JobError for each job that failed. waits for all queued jobs,
+    #including those submitted before
+    def map(self, function, args_list, **kwargs):
+
+        keys = [self.submit(function, *args, **kwargs) for args in args_list]
+        results = dict(self.as_completed())
+        return([results[key] for key in keys])
+
+    #stops the workers once they have finished the queued jobs, or with
+    #cancel right away, dropping the queued jobs and the running ones
+    def close(self, cancel=False):
+
+        if cancel:
+            try:
+                while True:
+                    self.tasks.get_nowait()
+            except queue.Empty:
+                pass
+            for process in self.processes:
+                process.terminate()
+        else:
+            for _ in self.processes:
+                self.tasks.put(None)
+        #results nobody collects would keep the workers from exiting
+        for process in self.processes:
+            while process.is_alive():
+                try:
+                    while True:
+                        self.results.get_nowait()
+                except queue.Empty:
+                    pass
+                process.join(timeout=POLL)
+        self.pending = 0
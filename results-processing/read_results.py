@@ -1,12 +1,32 @@
 import os
 import re
+import sqlite3
+from contextlib import closing
 from pathlib import Path
-from typing import Dict, List, Literal, Optional
+from typing import Dict, List, Literal, Optional, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+KEY = ["instance", "n", "Gamma", "Delta"]
+
+# Build, size and search statistics stored with every solve since the
+# statistics columns were added to the results store
+STATISTICS = [
+    "build_time",
+    "optimize_time",
+    "num_vars",
+    "num_constrs",
+    "num_nzs",
+    "presolved_vars",
+    "presolved_constrs",
+    "presolved_nzs",
+    "node_count",
+    "iter_count",
+    "peak_rss_mb",
+]
+
 
 def read_results(results_file: Path) -> pd.DataFrame:
     """
@@ -51,7 +71,77 @@ def read_results(results_file: Path) -> pd.DataFrame:
         {
             "instance": int,
             "n": int,
-            "Gamma": int,
+            "Gamma": float,
+            "Delta": int,
+            "status": int,
+            "objbound": float,
+            "objval": float,
+            "mipgap": float,
+            "runtime": float,
+        }
+    )
+    return df
+
+
+def read_results_db(
+    results_db: Path,
+    method: str,
+    K: Optional[int] = None,
+    time_limit: Optional[float] = None,
+) -> pd.DataFrame:
+    """
+    Reads the results of one method from a results store and returns a Pandas
+    DataFrame with the columns of read_results followed by the STATISTICS
+    columns. Statistics that a method did not record, or that a store written
+    before they were added does not have, are NaN.
+
+    Parameters:
+        results_db (Path): The path to the SQLite results store.
+        method (str): The method whose results are read, e.g. "assignment_ws".
+        K (Optional[int]): Only read the rows of this K. Methods other than
+            the general ones and the portfolio do not depend on K, are stored
+            with K = 0 and match any K.
+        time_limit (Optional[float]): Only read the rows of this time limit.
+
+    Returns:
+        pd.DataFrame: A Pandas DataFrame containing the results of the method.
+
+    Raises:
+        ValueError: If a cell (instance, n, Gamma, Delta) has several rows,
+            i.e. the store holds several K or time limits that were not
+            selected.
+    """
+    where, params = ["method = ?"], [method]
+    if K is not None:
+        where.append("K = ?")
+        params.append(K if method.startswith("general") or method == "portfolio" else 0)
+    if time_limit is not None:
+        where.append("time_limit = ?")
+        params.append(time_limit)
+    with closing(sqlite3.connect(results_db)) as conn:
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+        statistics = [c for c in STATISTICS if c in existing]
+        df = pd.read_sql_query(
+            "SELECT instance, n, Gamma, Delta, status, objbound, objval, mipgap, runtime"
+            + "".join(", " + c for c in statistics)
+            + " FROM results WHERE "
+            + " AND ".join(where)
+            + " ORDER BY n, instance, Gamma, Delta",
+            conn,
+            params=params,
+        )
+
+    if df.duplicated(KEY).any():
+        raise ValueError(
+            f"{results_db} has several rows per cell for method {method}, "
+            "select K and time_limit"
+        )
+
+    df = df.astype(
+        {
+            "instance": int,
+            "n": int,
+            "Gamma": float,
             "Delta": int,
             "status": int,
             "objbound": float,
@@ -60,69 +150,93 @@ def read_results(results_file: Path) -> pd.DataFrame:
             "runtime": float,
         }
     )
+    for c in STATISTICS:
+        df[c] = df[c].astype(float) if c in statistics else np.nan
     return df
 
 
+def runtime_matrix(results: Dict[str, pd.DataFrame], n: List[int]) -> np.ndarray:
+    """
+    Aligns the runtimes of a set of methods on (instance, n, Gamma, Delta).
+
+    Parameters:
+        results (Dict[str, pd.DataFrame]): A dictionary of method names as keys and
+            their corresponding runtime data as values in pandas DataFrames.
+        n (List[int]): Instance sizes to include.
+
+    Returns:
+        np.ndarray: An (instances x methods) matrix of runtimes, with the columns in
+            the order of results. Cells missing for any method are dropped.
+    """
+    frames = [data[data["n"].isin(n)].assign(method=m) for m, data in results.items()]
+    table = pd.concat(frames).pivot_table(
+        index=KEY, columns="method", values="runtime", aggfunc="first"
+    )
+    return table[list(results)].dropna().to_numpy()
+
+
 def get_performance_profiles(
-    results: Dict[str, pd.DataFrame], n: List[int]
-) -> Dict[str, dict]:
+    results: Dict[str, pd.DataFrame],
+    n: List[int],
+    time_limit: float = 600,
+    tau_max: float = 3.5,
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
     """
     Compute performance profiles for a set of methods based on their runtime data.
 
+    Runtimes of 0 are set to 0.01 and runtimes at the time limit get a performance
+    ratio of 700, so unsolved instances never count as solved within tau_max. The
+    profiles are the exact step functions P(log(p_im) <= tau), computed for all
+    methods at once from the sorted log performance ratios.
+
     Parameters:
         results (Dict[str, pd.DataFrame]): A dictionary of method names as keys and
             their corresponding runtime data as values in pandas DataFrames.
         n (List[int]): Instance sizes to include in plots.
+        time_limit (float): The time limit of the solves in seconds.
+        tau_max (float): The largest tau of the profiles.
 
     Returns:
-        Dict[str, dict]: A dictionary of method names as keys and their corresponding
-            performance profiles as values in dictionaries.
+        Dict[str, Tuple[np.ndarray, np.ndarray]]: A dictionary of method names as keys
+            and (tau, P) breakpoint arrays of their step functions as values. P[k] is
+            the profile on [tau[k], tau[k+1]).
 
     """
-
-    # Filter results for each method by values in n
-    filtered_results = {}
-    for m, data in results.items():
-        filtered_results[m] = data[data["n"].isin(n)]
-
-    # Format runtimes
-    for m, data in filtered_results.items():
-        data.loc[data["runtime"] == 0.00, "runtime"] = 0.01
-        data.loc[data["runtime"] > 600, "runtime"] = 600
+    t = runtime_matrix(results, n)
+    t = np.minimum(np.where(t == 0, 0.01, t), time_limit)
 
     # Compute performance ratios
-    t = {m: data["runtime"].tolist() for m, data in filtered_results.items()}
-    min_t = [min(t) for t in zip(*t.values())]
-    p = {
-        m: [700 if t[m][i] == 600 else t[m][i] / min_t[i] for i, _ in enumerate(t[m])]
-        for m in filtered_results
-    }
+    p = t / t.min(axis=1, keepdims=True)
+    p[t == time_limit] = 700
+    log_p = np.sort(np.log(p), axis=0)
 
     # Get performance profiles
-    I = len(p[m])
-    data_points = 1000
-    performance_profiles = {m: {} for m in filtered_results}
-    for idx in range(1, data_points + 1):
-        tau = 3.5 * idx / data_points
-        performance_profiles[m][tau] = sum(np.log(p[m][i]) < tau for i in range(I)) / I
+    I = log_p.shape[0]
+    performance_profiles = {}
+    for idx, m in enumerate(results):
+        breaks = log_p[(log_p[:, idx] > 0) & (log_p[:, idx] < tau_max), idx]
+        tau = np.unique(np.concatenate([[0.0], breaks]))
+        P = np.searchsorted(log_p[:, idx], tau, side="right") / I
+        performance_profiles[m] = (np.append(tau, tau_max), np.append(P, P[-1]))
     return performance_profiles
 
 
-def plot_performance_profiles(data: Dict[str, dict]) -> None:
+def plot_performance_profiles(data: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> None:
     """
     Plots the performance profiles for a given dictionary of data.
 
     Parameters:
-        data (Dict[str, dict]): A dictionary where the keys represent the names of the
-            performance profiles, and the values are dictionaries containing performance profile data.
+        data (Dict[str, Tuple[np.ndarray, np.ndarray]]): A dictionary where the keys
+            represent the names of the performance profiles, and the values are the
+            (tau, P) breakpoints of their step functions.
 
     Returns:
         None
     """
 
     fig, ax = plt.subplots()
-    for m, pp in data.items():
-        ax.plot(pp.keys(), pp.values(), label=m)
+    for m, (tau, P) in data.items():
+        ax.step(tau, P, where="post", label=m)
 
     # Remove boarder, grey background, grid lines.
     ax.spines["top"].set_visible(False)
@@ -134,52 +248,104 @@ def plot_performance_profiles(data: Dict[str, dict]) -> None:
     ax.tick_params(axis="both", which="both", color="white")
 
     ax.set_xlabel(r"$\tau$")
-    ax.set_xlim((0, max(pp.keys())))
+    ax.set_xlim((0, max(tau[-1] for tau, _ in data.values())))
     ax.set_ylabel(r"$P(\log(p_{im})\leq \tau)$")
     ax.set_ylim((0, 1.1))
     fig.savefig("performance_profile.pdf", format="pdf")
 
 
+def cell_metrics(
+    results: Dict[str, pd.DataFrame], time_limit: float = 600
+) -> pd.DataFrame:
+    """
+    Joins the results of all methods on (instance, n, Gamma, Delta) and computes the
+    per-cell metrics that are aggregated by aggregate.
+
+    The best known objective of a cell is the smallest objval over the methods that
+    have a result for it, so methods with missing or partial results only drop out
+    of the cells they did not solve. Runtimes of 0 are set to 0.01 and runtimes are
+    capped at the time limit. LBgap and UBgap (in %) are measured against the best
+    known objective and are 0 for cells solved to optimality.
+
+    Parameters:
+        results (Dict[str, pd.DataFrame]): A dictionary of method names as keys and
+            their results as values in pandas DataFrames.
+        time_limit (float): The time limit of the solves in seconds.
+
+    Returns:
+        pd.DataFrame: One row per method and cell with the columns of read_results
+            plus method, best_objval, solved, LBgap and UBgap.
+    """
+    data = pd.concat(
+        [df.assign(method=m) for m, df in results.items()], ignore_index=True
+    ).drop_duplicates(subset=["method"] + KEY, keep="last")
+
+    best = data.groupby(KEY)["objval"].transform("min")
+    unsolved = data["status"] != 2
+    return data.assign(
+        runtime=np.minimum(data["runtime"].where(data["runtime"] != 0, 0.01), time_limit),
+        best_objval=best,
+        solved=(~unsolved).astype(int),
+        LBgap=np.where(unsolved, (best - data["objbound"]) * 100 / best, 0),
+        UBgap=np.where(unsolved, (data["objval"] - best) * 100 / data["objval"], 0),
+    )
+
+
+def aggregate(cells: pd.DataFrame, by: List[str]) -> pd.DataFrame:
+    """
+    Aggregates per-cell metrics for every method over the given grouping.
+
+    Parameters:
+        cells (pd.DataFrame): Per-cell metrics as returned by cell_metrics.
+        by (List[str]): The columns to group by within each method, e.g. ["Gamma"],
+            ["Delta"], ["n"] or ["n", "Gamma", "Delta"].
+
+    Returns:
+        pd.DataFrame: Mean runtime, LBgap and UBgap, the number of cells solved to
+            optimality and the number of cells with a result, indexed by
+            (method, *by).
+    """
+    return (
+        cells.groupby(["method"] + by, sort=True)
+        .agg(
+            runtime=("runtime", "mean"),
+            LBgap=("LBgap", "mean"),
+            UBgap=("UBgap", "mean"),
+            solved=("solved", "sum"),
+            cells=("solved", "size"),
+        )
+        .round(1)
+    )
+
+
 def aggregate_results(
-    results: Dict[str, pd.DataFrame], parameter: Literal["Gamma", "Delta"], value: int
+    results: Dict[str, pd.DataFrame], parameter: Literal["Gamma", "Delta"], value: float
 ):
+    """
+    Writes the results aggregated by (n, Gamma, Delta) for the cells with the given
+    value of the given parameter to ../results/aggregate_by_<parameter>, one CSV per
+    method. Methods without a result for that value, e.g. of a partial or resumed
+    sweep, get no CSV.
 
-    # Filter results for each method by given value for given parameter.
-    filtered_results = {}
-    for m, data in results.items():
-        filtered_results[m] = data[data[parameter] == value]
-
-    # Compute best found solution across all solution methods
-    objvals = {m: data["objval"].tolist() for m, data in filtered_results.items()}
-    min_objval = [min(objval) for objval in zip(*objvals.values())]
-
-    # Format runtimes
-    for m, data in filtered_results.items():
-        data_copy = data.copy()
-        data_copy.loc[data["runtime"] == 0.00, "runtime"] = 0.01
-        data_copy.loc[data["runtime"] > 600, "runtime"] = 600
-        data_copy["solved"] = (data["status"] == 2).astype(int)
-        data_copy["LBgap"] = np.where(
-            data["status"] != 2, (min_objval - data["objbound"]) * 100 / min_objval, 0
-        )
-        data_copy["UBgap"] = np.where(
-            data["status"] != 2, (data["objval"] - min_objval) * 100 / data["objval"], 0
-        )
-        filtered_results[m] = data_copy
-        print(filtered_results[m])
-
-    aggregate_results = {}
-    for m, data in filtered_results.items():
-        aggregate_results[m] = (
-            data.groupby(["n", "Gamma", "Delta"])
-            .agg({"runtime": "mean", "LBgap": "mean", "UBgap": "mean", "solved": "sum"})
-            .round(1)
-        )
-        print(aggregate_results[m])
+    Parameters:
+        results (Dict[str, pd.DataFrame]): A dictionary of method names as keys and
+            their results as values in pandas DataFrames.
+        parameter (Literal["Gamma", "Delta"]): The parameter to filter on.
+        value (float): The value of the parameter.
 
-    for m, df in aggregate_results.items():
-        output_dir = Path(Path.cwd() / f"../results/aggregate_by_{parameter}")
-        os.makedirs(output_dir, exist_ok=True)
+    Returns:
+        None
+    """
+    table = aggregate(cell_metrics(results), ["n", "Gamma", "Delta"])
+    table = table[table.index.get_level_values(parameter) == value]
+
+    output_dir = Path(Path.cwd() / f"../results/aggregate_by_{parameter}")
+    os.makedirs(output_dir, exist_ok=True)
+    methods = set(table.index.get_level_values("method"))
+    for m in results:
+        if m not in methods:
+            continue
+        df = table.xs(m, level="method")[["runtime", "LBgap", "UBgap", "solved"]]
         filename = os.path.join(
             output_dir,
             f"{m}_aggregate_results.csv",